@@ -3,9 +3,49 @@ S3_FULL_TEXT_PATH = 'full-transcripts/'
 S3_SUMMARY_TEXT_PATH = 'summarized-text/'
 S3_GLUED_AUDIO_PATH = 'audio-files-glued/'
 S3_GLUED_ARCHIVED_AUDIO_PATH = 'audio-files-glued-archives/'
+S3_GLUED_OFFSETS_PATH = 'audio-files-glued-offsets/'
 S3_TRANSCRIPTION_PATH = 'transcriptions/'
 S3_HTML_PATH = 'html-files/'
+S3_TRANSCRIPTION_ARCHIVE_PATH = 'transcription-archive/'
+S3_CONTENT_HASH_METADATA = 'content-sha256'
+BROADCASTIFY_CALLS_URL = 'https://www.broadcastify.com/calls/tg/'
+DEFAULT_FEED_SYSTEM_ID = '6957'
+DEFAULT_FEED_ID = '1311'
 TRANSCRIPTION_JOB_NAME = 'transcription-job'
+SCRAPE_UPLOAD_WORKERS = 8
+SCRAPE_FEED_WORKERS = 4
+POLL_INITIAL_SECONDS = 300
+POLL_MIN_SECONDS = 60
+POLL_MAX_SECONDS = 900
+GLUE_PREFETCH_WINDOW = 8
+GLUE_MAX_CHUNKS = 500
+GLUE_MEMORY_CEILING_BYTES = 64 * 1024 * 1024
+GLUE_MULTIPART_CHUNK_BYTES = 8 * 1024 * 1024
+SILENCE_TRIM_ENABLED = False
+SILENCE_THRESHOLD_DBFS = -45
+SILENCE_MIN_SECONDS = 1.0
+SILENCE_PADDING_SECONDS = 0.25
+SILENCE_FRAME_MS = 30
+SILENCE_VAD_AGGRESSIVENESS = 2
+GLUE_FLUSH_MAX_CHUNKS = 25
+GLUE_FLUSH_MAX_AUDIO_SECONDS = 30 * 60
+GLUE_FLUSH_MAX_BYTES = 50 * 1024 * 1024
+GLUE_FLUSH_MAX_AGE_SECONDS = 60 * 60
+GLUE_ENCODE_PROFILE = 'mp3'
+TRANSCRIBE_POLL_INITIAL_SECONDS = 10
+TRANSCRIBE_POLL_MAX_SECONDS = 120
+TRANSCRIPTION_BACKEND = 'aws'
+LOCAL_WHISPER_MODEL = 'base.en'
+LOCAL_TRANSCRIBE_WORKERS = None
+CHUNK_CACHE_MAX_BYTES = 256 * 1024 * 1024
+DRIVER_POOL_MAX_USES = 50
+DRIVER_POOL_MAX_MEMORY_MB = 1024
+DRIVER_POOL_MAX_IDLE_SECONDS = 3600
+TRANSCRIPTION_ARCHIVE_AFTER_DAYS = 30
+LEASE_TTL_SECONDS = 5 * 60
+TRANSCRIBE_LEASE_TTL_SECONDS = 60 * 60
+DAILY_LEASE_TTL_SECONDS = 24 * 60 * 60
+TRANSCRIPTION_ARCHIVE_STORE = 'local'
 PROMPT_TEXT = ('I have a large amount of police scanner audio that has been transcribed into text. '
                'The transcription may have inaccuracies, missing words, or phrases that don\'t make sense due to the '
                'limitations of the transcriber. I need you to process this text and provide me with a high-level '
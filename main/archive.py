@@ -0,0 +1,183 @@
+import gzip
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+
+from context import TRANSCRIPTION_ARCHIVE_AFTER_DAYS, TRANSCRIPTION_ARCHIVE_STORE, S3_TRANSCRIPTION_ARCHIVE_PATH
+from main.models.transcription import decode_data
+
+ARCHIVED_COLUMNS = ("file_id", "data", "transcription", "summarized", "audio_url", "transcribe_url", "summary_id")
+
+
+class LocalArchiveStore:
+    """
+    Keeps archive files in a local directory, partitioned by day. Locations are absolute paths.
+    """
+
+    def __init__(self, directory=None):
+        if directory is None:
+            directory = Path("~/Radio Summary/archive").expanduser()
+        self.directory = Path(directory)
+
+    def write(self, name, path):
+        target = self.directory / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(path, target)
+        return str(target)
+
+    @staticmethod
+    def read(location):
+        return Path(location).read_bytes()
+
+
+class S3ArchiveStore:
+    """
+    Keeps archive files in S3 under S3_TRANSCRIPTION_ARCHIVE_PATH, partitioned by day.
+    Locations are s3:// URLs, like the audio_url and transcribe_url columns.
+    """
+
+    def __init__(self, s3=None, prefix=S3_TRANSCRIPTION_ARCHIVE_PATH):
+        from config import BUCKET_NAME
+        from main.helpers.s3.s3_helper import create_s3_client
+
+        self.s3 = s3 or create_s3_client()
+        self.bucket = BUCKET_NAME
+        self.prefix = prefix
+
+    def write(self, name, path):
+        key = f"{self.prefix}{name}"
+        self.s3.upload_file(str(path), self.bucket, key)
+        os.remove(path)
+        return f"s3://{self.bucket}/{key}"
+
+    @staticmethod
+    def read(location):
+        from main.helpers.s3.s3_helper import create_s3_client
+
+        bucket, key = location[len("s3://"):].split("/", 1)
+        return create_s3_client().get_object(Bucket=bucket, Key=key)["Body"].read()
+
+
+ARCHIVE_STORES = {
+    "local": LocalArchiveStore,
+    "s3": S3ArchiveStore,
+}
+
+
+def create_archive_store(name=None, **kwargs):
+    """
+    Creates the archive store named by name, the TRANSCRIPTION_ARCHIVE_STORE environment variable or
+    context.TRANSCRIPTION_ARCHIVE_STORE, in that order.
+    """
+    name = name or os.getenv("TRANSCRIPTION_ARCHIVE_STORE") or TRANSCRIPTION_ARCHIVE_STORE
+    if name not in ARCHIVE_STORES:
+        raise ValueError(f"Unknown archive store '{name}', expected one of {', '.join(ARCHIVE_STORES)}.")
+    return ARCHIVE_STORES[name](**kwargs)
+
+
+def archive_transcriptions(db, older_than_days=TRANSCRIPTION_ARCHIVE_AFTER_DAYS, store=None, batch_size=500):
+    """
+    Moves the raw Transcribe JSON of summarized transcriptions older than older_than_days out of the
+    database into gzip-compressed JSONL files, one per day of audio. Each archived row is left as a
+    stub with its text and urls but an empty data column, and its archive_key pointing to the file,
+    so Transcription.data reads it back from the archive on demand.
+
+    A day's file is written before its rows are stubbed, so a failed run never loses data.
+
+    :param store: The archive store, create_archive_store() if None.
+    :return: The number of transcriptions archived.
+    """
+    store = store or create_archive_store()
+    cutoff = int(time.time()) - older_than_days * 24 * 60 * 60
+    cursor = db.conn.execute(
+        f"""
+        SELECT {', '.join(ARCHIVED_COLUMNS)} FROM transcription
+        WHERE summarized = 1 AND archive_key IS NULL AND file_id < ?
+        ORDER BY file_id;
+        """,
+        (cutoff,)
+    )
+
+    archived = 0
+    day, writer = None, None
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                row_day = datetime.fromtimestamp(row["file_id"], timezone.utc).strftime("%Y/%m/%d")
+                if row_day != day:
+                    if writer:
+                        archived += writer.finish(db, store)
+                    day, writer = row_day, _DayWriter(row_day)
+                writer.add(row)
+        if writer:
+            archived += writer.finish(db, store)
+            writer = None
+    finally:
+        cursor.close()
+        if writer:
+            writer.discard()
+
+    if archived:
+        print(f"Archived the data of {archived} transcriptions older than {older_than_days} days.")
+    return archived
+
+
+def load_archived_data(location, file_id):
+    """
+    Reads the raw Transcribe JSON of an archived transcription back from its archive file.
+    """
+    return _read_archive(location).get(file_id, {})
+
+
+@lru_cache(maxsize=4)
+def _read_archive(location):
+    # Rows are usually read back a day at a time, so keep the last few decoded files
+    store = S3ArchiveStore if location.startswith("s3://") else LocalArchiveStore
+    archived = {}
+    for line in gzip.decompress(store.read(location)).splitlines():
+        record = json.loads(line)
+        archived[record["file_id"]] = record["data"]
+    return archived
+
+
+class _DayWriter:
+    """
+    Spools one day's archived rows to a temporary gzip file.
+    """
+
+    def __init__(self, day):
+        self.day = day
+        self.file_ids = []
+        fd, self.path = tempfile.mkstemp(suffix=".jsonl.gz")
+        os.close(fd)
+        self.file = gzip.open(self.path, "wt", encoding="utf-8")
+
+    def add(self, row):
+        record = {column: row[column] for column in ARCHIVED_COLUMNS}
+        record["data"] = decode_data(row["data"])
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.file_ids.append(row["file_id"])
+
+    def finish(self, db, store):
+        self.file.close()
+        # Named after the first and last file_id, so a later run for the same day adds a file next to this one
+        name = f"{self.day}/{self.file_ids[0]}-{self.file_ids[-1]}.jsonl.gz"
+        location = store.write(name, self.path)
+        with db.transaction() as conn:
+            conn.executemany(
+                "UPDATE transcription SET data = X'', archive_key = ? WHERE file_id = ?;",
+                [(location, file_id) for file_id in self.file_ids]
+            )
+        return len(self.file_ids)
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
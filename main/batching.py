@@ -0,0 +1,43 @@
+import time
+
+from context import (GLUE_FLUSH_MAX_CHUNKS, GLUE_FLUSH_MAX_AUDIO_SECONDS, GLUE_FLUSH_MAX_BYTES,
+                     GLUE_FLUSH_MAX_AGE_SECONDS)
+
+
+class FlushPolicy:
+    """
+    Decides when the pending chunks should be glued and sent to transcription.
+
+    A batch is flushed as soon as any limit is reached: the number of chunks, the total audio
+    duration, the total size, or the age of the oldest pending call. The age limit keeps quiet
+    nights fresh and the duration/size limits keep bursts from producing very long files.
+    A limit set to None is ignored.
+    """
+
+    def __init__(self, max_chunks=GLUE_FLUSH_MAX_CHUNKS, max_audio_seconds=GLUE_FLUSH_MAX_AUDIO_SECONDS,
+                 max_bytes=GLUE_FLUSH_MAX_BYTES, max_age_seconds=GLUE_FLUSH_MAX_AGE_SECONDS):
+        self.max_chunks = max_chunks
+        self.max_audio_seconds = max_audio_seconds
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+
+    def should_flush(self, pending, now=None):
+        """
+        :param pending: The pending batch, as returned by Database.get_pending_stats.
+        :param now: The current epoch time, defaults to time.time().
+        :return: The name of the limit that was reached, or None if the batch should keep filling.
+        """
+        if not pending["chunks"]:
+            return None
+        now = time.time() if now is None else now
+
+        if self.max_chunks is not None and pending["chunks"] >= self.max_chunks:
+            return "chunks"
+        if self.max_audio_seconds is not None and pending["audio_seconds"] >= self.max_audio_seconds:
+            return "audio_seconds"
+        if self.max_bytes is not None and pending["size_bytes"] >= self.max_bytes:
+            return "bytes"
+        if (self.max_age_seconds is not None and pending["oldest_timestamp"] is not None
+                and now - pending["oldest_timestamp"] >= self.max_age_seconds):
+            return "age"
+        return None
@@ -1,26 +1,143 @@
 # db/database.py
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
 
+from context import DEFAULT_FEED_ID, S3_AUDIO_PATH
+from main.db import migrations
+from main.helpers import filename_helper
+from main.leases import LeaseLost, check_fence
 from main.models.summary import Summary
 from main.models.transcription import Transcription
 
 
+# Applied to every connection. WAL lets readers run alongside the writer without blocking it,
+# and synchronous=NORMAL is durable across application crashes in WAL mode.
+CONNECTION_PRAGMAS = [
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",
+    "PRAGMA foreign_keys = ON;",
+    "PRAGMA busy_timeout = 30000;",
+    "PRAGMA temp_store = MEMORY;",
+    "PRAGMA cache_size = -16000;",
+    "PRAGMA mmap_size = 134217728;",
+]
+
+
+# FTS5 indexes over transcripts and summaries, kept in sync by triggers. The transcription
+# update trigger only fires when the text changes, so marking rows as summarized stays cheap.
+SEARCH_INDEX_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS transcription_fts USING fts5(
+    transcription, content='transcription', content_rowid='file_id'
+);
+
+CREATE TRIGGER IF NOT EXISTS transcription_fts_insert AFTER INSERT ON transcription BEGIN
+    INSERT INTO transcription_fts (rowid, transcription) VALUES (new.file_id, new.transcription);
+END;
+
+CREATE TRIGGER IF NOT EXISTS transcription_fts_delete AFTER DELETE ON transcription BEGIN
+    INSERT INTO transcription_fts (transcription_fts, rowid, transcription)
+    VALUES ('delete', old.file_id, old.transcription);
+END;
+
+CREATE TRIGGER IF NOT EXISTS transcription_fts_update AFTER UPDATE OF transcription ON transcription BEGIN
+    INSERT INTO transcription_fts (transcription_fts, rowid, transcription)
+    VALUES ('delete', old.file_id, old.transcription);
+    INSERT INTO transcription_fts (rowid, transcription) VALUES (new.file_id, new.transcription);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS summary_fts USING fts5(text);
+
+CREATE TRIGGER IF NOT EXISTS summary_fts_insert AFTER INSERT ON summary BEGIN
+    INSERT INTO summary_fts (rowid, text) VALUES (new.id, json_extract(new.data, '$.summary'));
+END;
+
+CREATE TRIGGER IF NOT EXISTS summary_fts_delete AFTER DELETE ON summary BEGIN
+    DELETE FROM summary_fts WHERE rowid = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS summary_fts_update AFTER UPDATE OF data ON summary BEGIN
+    DELETE FROM summary_fts WHERE rowid = old.id;
+    INSERT INTO summary_fts (rowid, text) VALUES (new.id, json_extract(new.data, '$.summary'));
+END;
+"""
+
+
+# glued_file_id of chunks recorded before the manifest existed, which the old gluer already glued
+PRE_MANIFEST_FILE_ID = 0
+# glued_file_id of chunks that were missing from S3 when their batch was glued
+MISSING_CHUNK_FILE_ID = -1
+
+
 class Database:
+    """
+    Access to the SQLite database. Every thread gets its own connection through the conn
+    property, so stages running on different threads can read while another one writes.
+    """
+
     def __init__(self, db_path=None):
         if db_path is None:
             db_path = Path("~/Radio Summary/radio_summary.db").expanduser()
-        self.db_path = db_path
+        self.db_path = Path(db_path)
         # Ensure the parent directory exists
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        self.conn = sqlite3.connect(self.db_path)
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
         self.create_tables()
+
+    @property
+    def conn(self):
+        """
+        The calling thread's connection, opened on first use.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # check_same_thread=False only so close() can close every thread's connection
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
     def connect(self):
-        self.conn = sqlite3.connect(self.db_path)
-        self.conn.execute("PRAGMA foreign_keys = ON;")
-        self.conn.row_factory = sqlite3.Row
+        """
+        Kept for callers of the old API, returns the calling thread's connection.
+        """
         return self.conn
 
+    @contextmanager
+    def transaction(self):
+        """
+        Runs the block in a write transaction on the calling thread's connection, committing
+        on success and rolling back on any exception. BEGIN IMMEDIATE takes the write lock up
+        front, so the transaction waits for busy_timeout instead of failing halfway through.
+        Nested calls join the outer transaction.
+
+        Usage:
+            with db.transaction() as conn:
+                conn.execute(...)
+        """
+        conn = self.conn
+        if conn.in_transaction:
+            yield conn
+            return
+
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+
     def create_tables(self):
 
         # create non-object tables
@@ -58,34 +175,214 @@ class Database:
         INSERT OR IGNORE INTO last_transcribed (id, filename) VALUES (1, '0-0.mp3');
         """
 
+        create_uploaded_chunk_table = """
+        CREATE TABLE IF NOT EXISTS uploaded_chunk (
+            filename TEXT PRIMARY KEY,
+            timestamp INTEGER NOT NULL,
+            uploaded_at TEXT NOT NULL,
+            feed_id TEXT,
+            s3_key TEXT,
+            glued_file_id INTEGER,
+            size_bytes INTEGER,
+            duration_seconds REAL
+        );
+        """
+
+        # one row per glued batch, used to measure end-to-end latency
+        create_glue_batch_table = """
+        CREATE TABLE IF NOT EXISTS glue_batch (
+            file_id INTEGER PRIMARY KEY,
+            chunk_count INTEGER NOT NULL,
+            audio_seconds REAL,
+            size_bytes INTEGER,
+            oldest_chunk_timestamp INTEGER,
+            flush_reason TEXT,
+            glued_at REAL NOT NULL,
+            transcribed_at REAL
+        );
+        """
+
+        # per-feed watermark and counter, seeded from the single-feed tables for the default feed
+        create_feed_state_table = """
+        CREATE TABLE IF NOT EXISTS feed_state (
+            feed_id TEXT PRIMARY KEY,
+            last_uploaded TEXT NOT NULL,
+            counter INTEGER NOT NULL
+        );
+        """
+
+        # transcripts keyed by the sha256 of the glued audio, so re-glued audio is not transcribed twice
+        create_transcript_cache_table = """
+        CREATE TABLE IF NOT EXISTS transcript_cache (
+            content_hash TEXT PRIMARY KEY,
+            file_id INTEGER NOT NULL,
+            output_key TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        );
+        """
+
+        # set once the manifest has been seeded from the chunks actually in S3 (see gluer.seed_manifest)
+        create_manifest_seed_table = """
+        CREATE TABLE IF NOT EXISTS manifest_seed (
+            id INTEGER PRIMARY KEY,
+            seeded_at REAL NOT NULL
+        );
+        """
+
+        insert_default_feed_state = """
+        INSERT OR IGNORE INTO feed_state (feed_id, last_uploaded, counter)
+        VALUES (
+            ?,
+            COALESCE((SELECT filename FROM last_uploaded WHERE id = 1), '0-0.mp3'),
+            COALESCE((SELECT value FROM counter WHERE id = 1), 0)
+        );
+        """
+
         # create object tables
 
         Transcription.create_table(self)
+        Transcription.compress_legacy_data(self)
         Summary.create_table(self)
+        self.create_search_index()
 
         self.conn.execute(create_last_uploaded_table)
         self.conn.execute(create_last_transcribed_table)
         self.conn.execute(create_counter_table)
+        self.conn.execute(create_uploaded_chunk_table)
+        self.conn.execute(create_feed_state_table)
+        self.conn.execute(create_glue_batch_table)
+        self.conn.execute(create_transcript_cache_table)
+        self.conn.execute(create_manifest_seed_table)
+        self.add_column_if_missing("uploaded_chunk", "feed_id", "TEXT")
+        self.add_column_if_missing("uploaded_chunk", "s3_key", "TEXT")
+        self.add_column_if_missing("uploaded_chunk", "glued_file_id", "INTEGER")
+        self.add_column_if_missing("uploaded_chunk", "size_bytes", "INTEGER")
+        self.add_column_if_missing("uploaded_chunk", "duration_seconds", "REAL")
+        # Rows written before the manifest were glued and deleted by the old gluer. Keep them out of
+        # the pending slice, under the key they had (audio-files/<feed_id>/ since feeds were added)
+        self.conn.execute(
+            "UPDATE uploaded_chunk SET s3_key = ? || COALESCE(feed_id || '/', '') || filename, glued_file_id = ? "
+            "WHERE s3_key IS NULL;",
+            (S3_AUDIO_PATH, PRE_MANIFEST_FILE_ID)
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_uploaded_chunk_s3_key ON uploaded_chunk (s3_key);")
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_uploaded_chunk_pending ON uploaded_chunk (glued_file_id, timestamp);"
+        )
 
         self.conn.execute(insert_last_uploaded)
         self.conn.execute(insert_last_transcribed)
         self.conn.execute(insert_counter)
+        self.conn.execute(insert_default_feed_state, (DEFAULT_FEED_ID,))
 
         self.conn.commit()
 
-    def get_counter(self):
-        """Retrieve the counter value from the database."""
+        migrations.migrate(self)
+
+    def create_search_index(self):
+        """
+        Creates the FTS5 full-text indexes over transcripts and summaries, with triggers that keep
+        them in sync on every insert, update and delete. An index created over existing rows is
+        filled from them once.
+
+        transcription_fts reads its text from the transcription table (external content), so the
+        transcripts are not stored twice. summary_fts stores the summary text pulled out of the
+        summary's JSON, so the "summary" key itself does not match every search.
+        """
+        existing = {
+            row[0] for row in self.conn.execute(
+                "SELECT name FROM sqlite_master WHERE name IN ('transcription_fts', 'summary_fts');"
+            )
+        }
+
+        self.conn.executescript(SEARCH_INDEX_SQL)
+
+        if "transcription_fts" not in existing:
+            self.conn.execute("INSERT INTO transcription_fts (transcription_fts) VALUES ('rebuild');")
+        if "summary_fts" not in existing:
+            self.conn.execute(
+                "INSERT INTO summary_fts (rowid, text) SELECT id, json_extract(data, '$.summary') FROM summary;"
+            )
+        self.conn.commit()
+
+    def search(self, query, limit=20):
+        """
+        Ranked full-text search over transcripts and summaries.
+
+        :param query: An FTS5 query, e.g. 'carjacking elden' or '"shots fired" NOT test'.
+        :param limit: The maximum number of transcripts and of summaries to return.
+        :return: A dict with "transcriptions", a list of dicts with file_id, summary_id and snippet,
+                 and "summaries", a list of dicts with summary_id, created_date and snippet. Both are
+                 ordered best match first.
+        """
+        try:
+            transcriptions = self.conn.execute(
+                """
+                SELECT t.file_id, t.summary_id, snippet(transcription_fts, 0, '[', ']', '...', 16)
+                FROM transcription_fts JOIN transcription t ON t.file_id = transcription_fts.rowid
+                WHERE transcription_fts MATCH ?
+                ORDER BY rank LIMIT ?;
+                """,
+                (query, limit)
+            ).fetchall()
+            summaries = self.conn.execute(
+                """
+                SELECT s.id, s.created_date, snippet(summary_fts, 0, '[', ']', '...', 16)
+                FROM summary_fts JOIN summary s ON s.id = summary_fts.rowid
+                WHERE summary_fts MATCH ?
+                ORDER BY rank LIMIT ?;
+                """,
+                (query, limit)
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"Invalid search query {query!r}: {e}")
+
+        return {
+            "transcriptions": [
+                {"file_id": row[0], "summary_id": row[1], "snippet": row[2]} for row in transcriptions
+            ],
+            "summaries": [
+                {"summary_id": row[0], "created_date": row[1], "snippet": row[2]} for row in summaries
+            ],
+        }
+
+    def add_column_if_missing(self, table, column, definition):
+        """
+        Adds a column to a table created by an older version of create_tables.
+        """
+        columns = [row[1] for row in self.conn.execute(f"PRAGMA table_info({table});")]
+        if column not in columns:
+            self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition};")
+
+    def ensure_feed(self, feed_id):
+        """Create the feed_state row for a feed if it does not exist yet."""
+        self.conn.execute(
+            "INSERT OR IGNORE INTO feed_state (feed_id, last_uploaded, counter) VALUES (?, '0-0.mp3', 0);",
+            (feed_id,)
+        )
+        self.conn.commit()
+
+    def get_counter(self, feed_id=None):
+        """
+        Retrieve the counter value from the database.
+        Returns the total across every feed when feed_id is None.
+        """
         cursor = self.conn.cursor()
-        cursor.execute("SELECT value FROM counter WHERE id = 1;")
+        if feed_id is None:
+            cursor.execute("SELECT COALESCE(SUM(counter), 0) FROM feed_state;")
+        else:
+            cursor.execute("SELECT counter FROM feed_state WHERE feed_id = ?;", (feed_id,))
         result = cursor.fetchone()
-        return result["value"] if result else 0
+        return result[0] if result else 0
 
-    def increment_counter(self):
+    def increment_counter(self, feed_id=DEFAULT_FEED_ID):
         """Increment the counter value in the database."""
+        self.ensure_feed(feed_id)
         cursor = self.conn.cursor()
-        cursor.execute("UPDATE counter SET value = value + 1 WHERE id = 1;")
+        cursor.execute("UPDATE feed_state SET counter = counter + 1 WHERE feed_id = ?;", (feed_id,))
         self.conn.commit()
-        cursor.execute("SELECT value FROM counter WHERE id = 1;")
+        cursor.execute("SELECT counter FROM feed_state WHERE feed_id = ?;", (feed_id,))
         result = cursor.fetchone()
         if result:
             counter_value = result[0]
@@ -94,23 +391,18 @@ class Database:
         else:
             raise RuntimeError("Failed to fetch the counter value.")
 
-    def set_last_uploaded_filename(self, filename):
+    def set_last_uploaded_filename(self, filename, feed_id=DEFAULT_FEED_ID):
         """
         Set the last uploaded filename in the database.
         If the record does not exist, it will be created.
         """
         cursor = self.conn.cursor()
         try:
-            # Check if the record exists
-            cursor.execute("SELECT COUNT(*) FROM last_uploaded WHERE id = 1;")
-            result = cursor.fetchone()
-
-            if result and result[0] == 0:
-                # Record doesn't exist, create it
-                cursor.execute("INSERT INTO last_uploaded (id, filename) VALUES (1, ?);", (filename,))
-            else:
-                # Update the existing record
-                cursor.execute("UPDATE last_uploaded SET filename = ? WHERE id = 1;", (filename,))
+            cursor.execute(
+                "INSERT OR IGNORE INTO feed_state (feed_id, last_uploaded, counter) VALUES (?, ?, 0);",
+                (feed_id, filename)
+            )
+            cursor.execute("UPDATE feed_state SET last_uploaded = ? WHERE feed_id = ?;", (filename, feed_id))
             self.conn.commit()
         except Exception as e:
             self.conn.rollback()
@@ -118,10 +410,290 @@ class Database:
         finally:
             cursor.close()
 
-    def get_last_uploaded_filename(self):
+    def record_uploaded_chunks(self, chunks, feed_id=DEFAULT_FEED_ID, lease=None):
+        """
+        Records a batch of uploaded chunks in a single transaction. Every chunk is added to the
+        uploaded_chunk manifest, the feed's counter is advanced by the number of new chunks and its
+        last_uploaded watermark moves to the newest filename.
+
+        :param chunks: The uploaded chunks, dicts with filename, s3_key, size_bytes and duration_seconds
+                       as returned by s3_helper.upload_mp3_to_s3.
+        :param feed_id: The feed the chunks were scraped from.
+        :param lease: The feed's scrape lease, if any. Nothing is recorded if it was lost.
+        :return: The feed's new counter value.
+        :raises LeaseLost: If lease is no longer held.
+        """
+        if not chunks:
+            return self.get_counter(feed_id)
+
+        uploaded_at = datetime.now().isoformat()
+        rows = [
+            (chunk["filename"], filename_helper.extract_timestamp_from_filename(chunk["filename"]), uploaded_at,
+             feed_id, chunk.get("s3_key") or S3_AUDIO_PATH + chunk["filename"], chunk.get("size_bytes"),
+             chunk.get("duration_seconds"))
+            for chunk in chunks
+        ]
+        newest_filename = max(rows, key=lambda row: row[1])[0]
+
+        try:
+            with self.transaction() as conn:
+                if lease:
+                    check_fence(conn, lease)
+                cursor = conn.executemany(
+                    "INSERT OR IGNORE INTO uploaded_chunk "
+                    "(filename, timestamp, uploaded_at, feed_id, s3_key, size_bytes, duration_seconds) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?);",
+                    rows
+                )
+                inserted = cursor.rowcount
+                conn.execute(
+                    "INSERT OR IGNORE INTO feed_state (feed_id, last_uploaded, counter) VALUES (?, '0-0.mp3', 0);",
+                    (feed_id,)
+                )
+                conn.execute(
+                    "UPDATE feed_state SET counter = counter + ?, last_uploaded = ? WHERE feed_id = ?;",
+                    (inserted, newest_filename, feed_id)
+                )
+                counter_value = conn.execute(
+                    "SELECT counter FROM feed_state WHERE feed_id = ?;", (feed_id,)
+                ).fetchone()[0]
+        except LeaseLost:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Failed to record uploaded chunks: {e}")
+
+        print(f"Audio Upload Counter ({feed_id}): " + str(counter_value))
+        return counter_value
+
+    def is_manifest_seeded(self):
+        return self.conn.execute("SELECT 1 FROM manifest_seed WHERE id = 1;").fetchone() is not None
+
+    def seed_manifest(self, s3_keys):
+        """
+        Records the chunks found in S3 as pending, once. Chunks uploaded before the manifest
+        existed would otherwise never be glued: keys without a row are added, and pre-manifest
+        rows whose chunk is still in S3 are made pending again. Later calls do nothing.
+
+        :param s3_keys: Every chunk key under S3_AUDIO_PATH.
+        :return: The number of chunks made pending.
+        """
+        uploaded_at = datetime.now().isoformat()
+        rows = []
+        for s3_key in s3_keys:
+            filename = s3_key.rsplit("/", 1)[-1]
+            timestamp = filename_helper.extract_timestamp_from_filename(filename)
+            if timestamp is None:
+                continue
+            # audio-files/<feed_id>/<filename>, or audio-files/<filename> from before feeds were added
+            parts = s3_key[len(S3_AUDIO_PATH):].split("/")
+            feed_id = parts[0] if len(parts) > 1 else DEFAULT_FEED_ID
+            rows.append((filename, timestamp, uploaded_at, feed_id, s3_key))
+
+        with self.transaction() as conn:
+            if conn.execute("SELECT 1 FROM manifest_seed WHERE id = 1;").fetchone():
+                return 0
+            before = conn.total_changes
+            conn.executemany(
+                """
+                INSERT INTO uploaded_chunk (filename, timestamp, uploaded_at, feed_id, s3_key)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (filename) DO UPDATE SET s3_key = excluded.s3_key, glued_file_id = NULL
+                WHERE uploaded_chunk.glued_file_id = ?;
+                """,
+                [row + (PRE_MANIFEST_FILE_ID,) for row in rows]
+            )
+            seeded = conn.total_changes - before
+            conn.execute("INSERT INTO manifest_seed (id, seeded_at) VALUES (1, ?);", (time.time(),))
+        if seeded:
+            print(f"Seeded the chunk manifest with {seeded} chunks found in S3.")
+        return seeded
+
+    def quarantine_chunks(self, s3_keys):
+        """
+        Takes chunks that are missing from S3 out of the pending slice, so they cannot block every
+        later batch.
+        """
+        if not s3_keys:
+            return
+        with self.transaction() as conn:
+            conn.executemany(
+                "UPDATE uploaded_chunk SET glued_file_id = ? WHERE s3_key = ? AND glued_file_id IS NULL;",
+                [(MISSING_CHUNK_FILE_ID, s3_key) for s3_key in s3_keys]
+            )
+        print(f"Quarantined {len(s3_keys)} chunks missing from S3.")
+
+    def get_pending_chunks(self, limit=None, max_audio_seconds=None, max_bytes=None):
+        """
+        Returns the manifest slice of uploaded chunks that have not been glued yet, oldest first.
+        The slice ends before the chunk that would take its total duration past max_audio_seconds
+        or its total size past max_bytes, but always holds at least one chunk. Chunks recorded
+        without a duration or size count as zero.
+
+        :param limit: The maximum number of chunks to return, all of them if None.
+        :param max_audio_seconds: The maximum total duration of the slice, unbounded if None.
+        :param max_bytes: The maximum total size of the slice, unbounded if None.
+        :return: A list of S3 keys.
+        """
+        sql = """
+            SELECT s3_key, COALESCE(duration_seconds, 0), COALESCE(size_bytes, 0) FROM uploaded_chunk
+            WHERE glued_file_id IS NULL
+            ORDER BY timestamp, filename
+        """
+        params = []
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        keys = []
+        audio_seconds = size_bytes = 0
+        for s3_key, duration, size in self.conn.execute(sql, params):
+            audio_seconds += duration
+            size_bytes += size
+            if keys and ((max_audio_seconds is not None and audio_seconds > max_audio_seconds)
+                         or (max_bytes is not None and size_bytes > max_bytes)):
+                break
+            keys.append(s3_key)
+        return keys
+
+    def get_pending_stats(self):
+        """
+        Summarises the chunks waiting to be glued, for the flush policy.
+
+        Returns:
+            dict: chunks, audio_seconds, size_bytes and oldest_timestamp (epoch seconds of the
+                  oldest pending call, None when nothing is pending).
+        """
+        row = self.conn.execute(
+            """
+            SELECT COUNT(*), COALESCE(SUM(duration_seconds), 0), COALESCE(SUM(size_bytes), 0), MIN(timestamp)
+            FROM uploaded_chunk WHERE glued_file_id IS NULL;
+            """
+        ).fetchone()
+        return {"chunks": row[0], "audio_seconds": row[1], "size_bytes": row[2], "oldest_timestamp": row[3]}
+
+    def mark_chunks_glued(self, s3_keys, glued_file_id, flush_reason=None, lease=None):
+        """
+        Marks exactly the given chunks as glued into glued_file_id and takes them off their
+        feeds' counters, in a single transaction. Chunks uploaded after the manifest slice was
+        read stay pending. The batch is recorded in glue_batch for latency tracking.
+
+        If lease (the glue lease) is given, nothing is marked once it is lost and LeaseLost is raised.
+        """
+        if not s3_keys:
+            return
+
+        try:
+            with self.transaction() as conn:
+                if lease:
+                    check_fence(conn, lease)
+                conn.executemany(
+                    "UPDATE uploaded_chunk SET glued_file_id = ? WHERE s3_key = ? AND glued_file_id IS NULL;",
+                    [(glued_file_id, s3_key) for s3_key in s3_keys]
+                )
+                conn.execute(
+                    """
+                    UPDATE feed_state SET counter = MAX(counter - (
+                        SELECT COUNT(*) FROM uploaded_chunk
+                        WHERE glued_file_id = ? AND COALESCE(uploaded_chunk.feed_id, ?) = feed_state.feed_id
+                    ), 0);
+                    """,
+                    (glued_file_id, DEFAULT_FEED_ID)
+                )
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO glue_batch
+                        (file_id, chunk_count, audio_seconds, size_bytes, oldest_chunk_timestamp, flush_reason, glued_at)
+                    SELECT ?, COUNT(*), SUM(duration_seconds), SUM(size_bytes), MIN(timestamp), ?, ?
+                    FROM uploaded_chunk WHERE glued_file_id = ?;
+                    """,
+                    (glued_file_id, flush_reason, time.time(), glued_file_id)
+                )
+        except LeaseLost:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Failed to mark chunks as glued: {e}")
+
+    def record_batch_transcribed(self, file_id):
+        """
+        Stamps a glued batch as transcribed and prints its end-to-end latency, from the oldest
+        call in the batch being broadcast to its transcript being saved.
+
+        :return: The end-to-end latency in seconds, or None if the batch is unknown.
+        """
+        transcribed_at = time.time()
+        self.conn.execute("UPDATE glue_batch SET transcribed_at = ? WHERE file_id = ?;", (transcribed_at, file_id))
+        self.conn.commit()
+        row = self.conn.execute(
+            "SELECT oldest_chunk_timestamp, glued_at, chunk_count FROM glue_batch WHERE file_id = ?;", (file_id,)
+        ).fetchone()
+        if not row or row[0] is None:
+            return None
+
+        latency = transcribed_at - row[0]
+        print(f"Batch {file_id}: {row[2]} chunks, end-to-end latency {latency:.0f}s "
+              f"(waiting to glue {row[1] - row[0]:.0f}s, transcription {transcribed_at - row[1]:.0f}s)")
+        return latency
+
+    def get_batch_latencies(self, limit=50):
+        """
+        Returns the most recent transcribed batches with their latencies in seconds, newest first.
+        """
+        rows = self.conn.execute(
+            """
+            SELECT file_id, chunk_count, audio_seconds, flush_reason,
+                   glued_at - oldest_chunk_timestamp, transcribed_at - glued_at, transcribed_at - oldest_chunk_timestamp
+            FROM glue_batch WHERE transcribed_at IS NOT NULL
+            ORDER BY file_id DESC LIMIT ?;
+            """,
+            (limit,)
+        ).fetchall()
+        return [
+            {
+                "file_id": row[0],
+                "chunk_count": row[1],
+                "audio_seconds": row[2],
+                "flush_reason": row[3],
+                "glue_wait_seconds": row[4],
+                "transcription_seconds": row[5],
+                "end_to_end_seconds": row[6],
+            }
+            for row in rows
+        ]
+
+    def get_cached_transcript(self, content_hash):
+        """
+        Looks up the transcript of previously transcribed audio with the same content hash.
+
+        :return: A dict with the file_id the audio was first transcribed as and the S3 output_key
+                 of its transcript JSON, or None on a miss.
+        """
+        row = self.conn.execute(
+            "SELECT file_id, output_key FROM transcript_cache WHERE content_hash = ?;", (content_hash,)
+        ).fetchone()
+        if not row:
+            return None
+        return {"file_id": row[0], "output_key": row[1]}
+
+    def save_cached_transcript(self, content_hash, file_id, output_key):
+        self.conn.execute(
+            "INSERT OR IGNORE INTO transcript_cache (content_hash, file_id, output_key, created_at) "
+            "VALUES (?, ?, ?, ?);",
+            (content_hash, file_id, output_key, datetime.now().isoformat())
+        )
+        self.conn.commit()
+
+    def record_transcript_cache_hit(self, content_hash):
+        self.conn.execute("UPDATE transcript_cache SET hits = hits + 1 WHERE content_hash = ?;", (content_hash,))
+        self.conn.commit()
+
+    def get_transcript_cache_stats(self):
+        row = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM transcript_cache;").fetchone()
+        return {"entries": row[0], "hits": row[1]}
+
+    def get_last_uploaded_filename(self, feed_id=DEFAULT_FEED_ID):
         cursor = self.conn.cursor()
         try:
-            cursor.execute("SELECT filename FROM last_uploaded WHERE id = 1;")
+            cursor.execute("SELECT last_uploaded FROM feed_state WHERE feed_id = ?;", (feed_id,))
             result = cursor.fetchone()
             if result:
                 last_filename = result[0]
@@ -174,11 +746,14 @@ class Database:
         finally:
             cursor.close()
 
-    def reset_counter(self):
-        """Reset the counter value to 0 in the database."""
+    def reset_counter(self, feed_id=None):
+        """Reset the counter value to 0 in the database, for every feed when feed_id is None."""
         cursor = self.conn.cursor()
         try:
-            cursor.execute("UPDATE counter SET value = 0 WHERE id = 1;")
+            if feed_id is None:
+                cursor.execute("UPDATE feed_state SET counter = 0;")
+            else:
+                cursor.execute("UPDATE feed_state SET counter = 0 WHERE feed_id = ?;", (feed_id,))
             self.conn.commit()
         except Exception as e:
             self.conn.rollback()
@@ -187,5 +762,11 @@ class Database:
             cursor.close()
 
     def close(self):
-        if self.conn:
-            self.conn.close()
+        """
+        Closes the connections of every thread.
+        """
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
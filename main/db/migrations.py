@@ -0,0 +1,42 @@
+# db/migrations.py
+
+# Schema changes applied on top of the tables created by Database.create_tables, in order. The
+# database's PRAGMA user_version holds the number of migrations already applied, so each one runs
+# exactly once. Only ever append to this list.
+MIGRATIONS = [
+    # summaries are looked up by date range
+    "CREATE INDEX IF NOT EXISTS idx_summary_created_date ON summary (created_date);",
+    # and the transcriptions behind a summary by summary_id, in file_id order through the rowid
+    "CREATE INDEX IF NOT EXISTS idx_transcription_summary_id ON transcription (summary_id);",
+    # expiring leases with fencing tokens, so several workers can share the pipeline (see main.leases)
+    """
+    CREATE TABLE IF NOT EXISTS lease (
+        name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        token INTEGER NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    """,
+]
+
+
+def get_schema_version(db):
+    return db.conn.execute("PRAGMA user_version;").fetchone()[0]
+
+
+def migrate(db):
+    """
+    Applies the migrations the database has not seen yet, each in its own transaction together with
+    the version bump, so a failed migration leaves the schema at the last good version. The version
+    is read inside the transaction, so workers starting together never apply a migration twice.
+
+    :return: The schema version after migrating.
+    """
+    while True:
+        with db.transaction() as conn:
+            version = get_schema_version(db)
+            if version >= len(MIGRATIONS):
+                return version
+            conn.execute(MIGRATIONS[version])
+            conn.execute(f"PRAGMA user_version = {version + 1};")
+        print(f"Applied database migration {version + 1}.")
@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from context import DRIVER_POOL_MAX_USES, DRIVER_POOL_MAX_MEMORY_MB, DRIVER_POOL_MAX_IDLE_SECONDS
+from main.utils import setup_chrome_driver
+
+
+class PooledDriver:
+    """
+    A WebDriver kept alive by the pool, along with its usage bookkeeping.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+
+
+class DriverPool:
+    """
+    Keeps authenticated Chrome drivers warm between scheduler ticks.
+
+    Drivers are health-checked before they are handed out and are recycled after max_uses
+    acquisitions, when the browser's memory grows past max_memory_mb, or after sitting idle
+    for max_idle_seconds. The time each acquisition took is recorded in acquire_timings.
+    """
+
+    def __init__(self, driver_factory=setup_chrome_driver, size=1, max_uses=DRIVER_POOL_MAX_USES,
+                 max_memory_mb=DRIVER_POOL_MAX_MEMORY_MB, max_idle_seconds=DRIVER_POOL_MAX_IDLE_SECONDS):
+        self.driver_factory = driver_factory
+        self.size = size
+        self.max_uses = max_uses
+        self.max_memory_mb = max_memory_mb
+        self.max_idle_seconds = max_idle_seconds
+        self.acquire_timings = deque(maxlen=100)
+        self._idle = []
+        self._created = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def acquire(self):
+        """
+        Yields a healthy driver. The driver goes back to the pool on exit, or is discarded
+        if the block raised, since the browser may be left in an unknown state.
+        """
+        start = time.monotonic()
+        entry = self._checkout()
+        elapsed = time.monotonic() - start
+        self.acquire_timings.append(elapsed)
+        print(f"Acquired driver in {elapsed:.2f}s (use #{entry.uses + 1})")
+
+        try:
+            yield entry.driver
+        except Exception:
+            self._discard(entry)
+            raise
+        else:
+            self._release(entry)
+
+    def reap_idle(self):
+        """
+        Quits drivers that have been idle for longer than max_idle_seconds.
+        """
+        now = time.monotonic()
+        with self._condition:
+            stale = [entry for entry in self._idle if now - entry.last_used_at > self.max_idle_seconds]
+            self._idle = [entry for entry in self._idle if entry not in stale]
+        for entry in stale:
+            print("Recycling idle driver.")
+            self._discard(entry)
+
+    def close(self):
+        """
+        Quits every idle driver.
+        """
+        with self._condition:
+            idle, self._idle = self._idle, []
+        for entry in idle:
+            self._discard(entry)
+
+    def _checkout(self):
+        while True:
+            with self._condition:
+                while not self._idle and self._created >= self.size:
+                    self._condition.wait()
+                if self._idle:
+                    entry = self._idle.pop()
+                else:
+                    entry = None
+                    self._created += 1
+
+            if entry is None:
+                try:
+                    return PooledDriver(self.driver_factory())
+                except Exception:
+                    with self._condition:
+                        self._created -= 1
+                        self._condition.notify()
+                    raise
+
+            if self._is_healthy(entry):
+                return entry
+            print("Driver failed health check, replacing it.")
+            self._discard(entry)
+
+    def _release(self, entry):
+        entry.uses += 1
+        entry.last_used_at = time.monotonic()
+
+        if entry.uses >= self.max_uses:
+            print(f"Recycling driver after {entry.uses} uses.")
+            self._discard(entry)
+            return
+
+        memory_mb = browser_memory_mb(entry.driver)
+        if memory_mb is not None and memory_mb > self.max_memory_mb:
+            print(f"Recycling driver using {memory_mb:.0f} MB.")
+            self._discard(entry)
+            return
+
+        with self._condition:
+            self._idle.append(entry)
+            self._condition.notify()
+
+    def _discard(self, entry):
+        try:
+            entry.driver.quit()
+        except Exception as e:
+            print(f"Failed to quit driver: {e}")
+        with self._condition:
+            self._created -= 1
+            self._condition.notify()
+
+    @staticmethod
+    def _is_healthy(entry):
+        try:
+            return entry.driver.execute_script("return 1;") == 1
+        except Exception:
+            return False
+
+
+def browser_memory_mb(driver):
+    """
+    Returns the resident memory of the chromedriver process and every process it spawned, in MB.
+    Returns None when it cannot be measured (no /proc, or no service process).
+    """
+    try:
+        root_pid = driver.service.process.pid
+    except AttributeError:
+        return None
+    if not os.path.isdir("/proc"):
+        return None
+
+    # Build a parent -> children map of every running process
+    children = {}
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces, the ppid is the second field after it
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(pid))
+
+    total_kb = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return total_kb / 1024
@@ -0,0 +1,120 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from pydub import AudioSegment
+
+from context import GLUE_ENCODE_PROFILE
+
+
+class EncodeProfile:
+    """
+    How the glued audio is stored and sent to Transcribe.
+
+    :param name: The name used to select the profile, see GLUE_ENCODE_PROFILE.
+    :param extension: The file extension of the glued file, e.g. '.flac'.
+    :param media_format: The Transcribe MediaFormat of the encoded audio.
+    :param ffmpeg_args: The ffmpeg output arguments, or None to keep the glued MP3 as is.
+    """
+
+    def __init__(self, name, extension, media_format, ffmpeg_args=None):
+        self.name = name
+        self.extension = extension
+        self.media_format = media_format
+        self.ffmpeg_args = ffmpeg_args
+
+    def __repr__(self):
+        return f"EncodeProfile({self.name})"
+
+
+# Scanner audio is narrowband speech, 16 kHz mono keeps everything Transcribe needs
+ENCODE_PROFILES = {
+    profile.name: profile
+    for profile in [
+        EncodeProfile("mp3", ".mp3", "mp3"),
+        EncodeProfile("mp3-mono-32k", ".mp3", "mp3",
+                      ["-ac", "1", "-ar", "16000", "-codec:a", "libmp3lame", "-b:a", "32k", "-f", "mp3"]),
+        EncodeProfile("flac-16k", ".flac", "flac",
+                      ["-ac", "1", "-ar", "16000", "-sample_fmt", "s16", "-codec:a", "flac", "-f", "flac"]),
+        EncodeProfile("opus-16k", ".ogg", "ogg",
+                      ["-ac", "1", "-ar", "16000", "-codec:a", "libopus", "-b:a", "16k", "-application", "voip",
+                       "-f", "ogg"]),
+    ]
+}
+
+# Transcribe MediaFormat of every extension a glued file can have
+MEDIA_FORMATS = {profile.extension: profile.media_format for profile in ENCODE_PROFILES.values()}
+
+
+def get_profile(name=GLUE_ENCODE_PROFILE):
+    try:
+        return ENCODE_PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown encode profile '{name}', expected one of {', '.join(ENCODE_PROFILES)}.")
+
+
+def encode(audio_file, profile):
+    """
+    Transcodes the glued MP3 with ffmpeg, streaming it through stdin into a temporary file.
+
+    :param audio_file: A file-like object holding the glued MP3, positioned at the start.
+    :param profile: The EncodeProfile to encode with.
+    :return: A temporary file holding the encoded audio, or audio_file itself if the profile
+             keeps the MP3 as is.
+    """
+    if profile.ffmpeg_args is None:
+        return audio_file
+
+    output = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        [AudioSegment.converter, "-y", "-f", "mp3", "-i", "pipe:0", *profile.ffmpeg_args, "pipe:1"],
+        stdin=subprocess.PIPE, stdout=output, stderr=subprocess.DEVNULL
+    )
+    try:
+        shutil.copyfileobj(audio_file, process.stdin)
+    except Exception:
+        process.kill()
+        output.close()
+        raise
+    finally:
+        process.stdin.close()
+        process.wait()
+
+    if process.returncode != 0:
+        output.close()
+        raise RuntimeError(f"ffmpeg exited with code {process.returncode} while encoding {profile.name}.")
+
+    output.seek(0)
+    return output
+
+
+def benchmark(paths):
+    """
+    Encodes each MP3 with every profile and prints the encoded size and encode time,
+    to pick GLUE_ENCODE_PROFILE.
+    """
+    print(f"{'file':<30} {'profile':<14} {'bytes':>12} {'ratio':>7} {'seconds':>8}")
+    for path in paths:
+        original_size = os.path.getsize(path)
+        for profile in ENCODE_PROFILES.values():
+            with open(path, "rb") as audio_file:
+                start = time.perf_counter()
+                encoded = encode(audio_file, profile)
+                elapsed = time.perf_counter() - start
+                encoded.seek(0, os.SEEK_END)
+                size = encoded.tell()
+                if encoded is not audio_file:
+                    encoded.close()
+            print(f"{os.path.basename(path):<30} {profile.name:<14} {size:>12} "
+                  f"{size / original_size:>7.2f} {elapsed:>8.2f}")
+
+
+# Usage: python -m main.encode_profiles glued1.mp3 [glued2.mp3 ...]
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m main.encode_profiles <glued mp3> [<glued mp3> ...]")
+        sys.exit(1)
+    benchmark(sys.argv[1:])
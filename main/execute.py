@@ -8,27 +8,53 @@ from dotenv import load_dotenv
 
 from sqlalchemy.orm import declarative_base
 
-from main.gluer import glue
+from context import DAILY_LEASE_TTL_SECONDS
+from main.archive import archive_transcriptions
+from main.batching import FlushPolicy
+from main.gluer import glue, seed_manifest
+from main.leases import LeaseLost, LeaseManager
+from main.driver_pool import DriverPool
+from main.feed_scheduler import scrape_feeds
+from main.feeds import load_feeds
+from main.helpers.chunk_cache import ChunkCache
 from main.login_and_scrape import run_broadcastify_job
+from main.poller import AdaptivePoller
 from main.summarizer import summarize
-from main.transcriber import transcribe
+from main.transcriber import poll_transcriptions, transcribe
 from main.db.database import Database
-from main.helpers.s3 import s3_helper
-from main.utils import setup_chrome_driver
 
 # -- Main Fields -- #
 
 Base = declarative_base()
-feed_id = "1311"
+driver_pool = DriverPool()
+poller = AdaptivePoller()
+flush_policy = FlushPolicy()
+chunk_cache = ChunkCache()
 
 # -- Functions -- #
 
-# Uses selenium to log-in and scrape audio
-def scrape(db):
-    driver = setup_chrome_driver()
+# Scrapes every feed in parallel over HTTP with the saved session, using selenium only to log-in again.
+# Set SCRAPE_MODE=browser to scrape the feeds one by one through the pooled selenium driver instead.
+# Returns the overlap stats of every scraped feed.
+def scrape(db, leases):
     email = get_env_variable("BROADCASTIFY_EMAIL")
     password = get_env_variable("BROADCASTIFY_PASSWORD")
-    run_broadcastify_job(driver, db, email, password)
+    feeds = load_feeds()
+    if get_env_variable("SCRAPE_MODE") == "browser":
+        feed_stats = []
+        with driver_pool.acquire() as driver:
+            for feed in feeds:
+                with leases.hold(f"scrape:{feed.feed_id}") as lease:
+                    if not lease:
+                        continue
+                    stats = run_broadcastify_job(driver, db, email, password, feed, chunk_cache, lease)
+                    if stats is not None:
+                        feed_stats.append(stats)
+    else:
+        feed_stats = list(scrape_feeds(db, feeds, email, password, driver_pool=driver_pool,
+                                       cache=chunk_cache, leases=leases).values())
+    driver_pool.reap_idle()
+    return feed_stats
 
 def wipe_database(db):
     """
@@ -71,40 +97,76 @@ def main():
     # Wipe DB for testing if needed
     #wipe_database(db)
 
-    # Execution Code
-    execute(db)
-    schedule.every(5).minutes.do(execute, db)
-
     # summarize and email at 7:30AM every day
     schedule_summarizer_task(7, 30, db)
 
+    # move the data of old summarized transcriptions out to the archive every night
+    schedule.every().day.at("03:00").do(archive_nightly, db)
+
+    # Execution Code, the poller adapts the interval to the call arrival rate
     while True:
         schedule.run_pending()
+        if poller.is_due():
+            execute(db)
+        # finish transcription jobs as they complete, without waiting for the next scrape
+        poll_transcriptions(db)
         time.sleep(1)
 
 
+# Claims a once-a-day task for day across all workers. The lease is kept until it expires instead of
+# being released, so a worker whose schedule fires after the task finished does not run it again.
+def claim_daily(db, name, day):
+    return LeaseManager(db).acquire(f"{name}:{day}", ttl_seconds=DAILY_LEASE_TTL_SECONDS)
+
+def archive_nightly(db):
+    if claim_daily(db, "archive", datetime.now().strftime("%Y-%m-%d")):
+        archive_transcriptions(db)
+
 def schedule_summarizer_task(hour, minute, db):
     def wrapper():
         est = pytz.timezone('US/Eastern')
         now = datetime.now(est)
         print(f"Executing task at {now}")
-        summarize(db)
+        # only one of several workers summarizes each day
+        if claim_daily(db, "summarize", now.strftime("%Y-%m-%d")):
+            summarize(db)
 
     # Schedule the function at the specific time in EST
     schedule.every().day.at(f"{hour:02d}:{minute:02d}").do(wrapper)
 
+# Glues bounded batches while the flush policy still finds a reason to flush, renewing the glue
+# lease between batches. Stops when a batch fails or the lease is lost to another worker.
+# Returns the number of batches glued.
+def glue_backlog(db, leases, lease):
+    batches = 0
+    while True:
+        flush_reason = flush_policy.should_flush(db.get_pending_stats())
+        if not flush_reason:
+            break
+        if not glue(db, flush_reason=flush_reason, cache=chunk_cache, lease=lease, flush_policy=flush_policy):
+            break
+        batches += 1
+        try:
+            leases.renew(lease)
+        except LeaseLost:
+            print("Lost the glue lease, leaving the rest of the backlog to its new holder.")
+            break
+    return batches
+
 # scrapes, glues, and transcribes
+# Each stage claims its work through leases, so several workers sharing the database divide it.
 def execute(db):
-    scrape(db)
+    leases = LeaseManager(db)
+    poller.observe(scrape(db, leases))
 
-    # glue audio
-    counter_value = db.get_counter()
-    if counter_value >= 25:
-        if glue():
-            db.reset_counter()
-            s3_helper.delete_directory_files()
+    # glue audio once the pending batch is big or old enough, one worker at a time. Each batch is
+    # bounded by the flush policy, so keep gluing until the backlog no longer calls for a flush.
+    with leases.hold("glue") as lease:
+        if lease:
+            seed_manifest(db)
+            glue_backlog(db, leases, lease)
 
-    # transcribe audio
+    # submit transcription jobs, they are finished by poll_transcriptions
     transcribe(db)
 
 
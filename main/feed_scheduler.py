@@ -0,0 +1,178 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from context import SCRAPE_FEED_WORKERS, SCRAPE_UPLOAD_WORKERS
+from main.helpers.s3 import s3_helper
+from main.leases import LeaseLost
+from main.login_and_scrape import (COOKIES_FILE, fetch_mp3_urls, load_cookie_session, measure_overlap,
+                                   relogin, run_broadcastify_job, select_new_chunks, upload_new_chunks)
+from main.utils import setup_chrome_driver
+
+# scrape_feed's result when the calls table is there but lists no calls although the feed had calls
+# before. The rows may be filled in by JavaScript, so the feed is scraped with Selenium instead.
+EMPTY_CALLS_TABLE = "empty_calls_table"
+
+
+def had_calls(last_uploaded_filename):
+    """
+    Whether a call was ever uploaded for the feed, i.e. its watermark is not the initial '0-0.mp3'.
+    """
+    return bool(last_uploaded_filename) and last_uploaded_filename != "0-0.mp3"
+
+
+def scrape_feed(feed, last_uploaded_filename, cookies_file, upload_executor, http, s3, cache=None):
+    """
+    Scrapes one feed's calls page and uploads its new chunks. Runs on a worker thread, so it
+    never touches the database: the watermark is passed in and the result is recorded by the caller.
+
+    :return: The uploaded chunks in timestamp order and the overlap stats of the scrape,
+             None if the saved session was rejected, or EMPTY_CALLS_TABLE if the calls table
+             was empty on a feed that had calls before.
+    """
+    page_session = load_cookie_session(cookies_file)
+    try:
+        mp3_urls = fetch_mp3_urls(page_session, feed.url)
+    finally:
+        page_session.close()
+
+    if mp3_urls is None:
+        return None
+    if not mp3_urls and had_calls(last_uploaded_filename):
+        print(f"The calls table of {feed} is empty although the feed had calls before, "
+              f"its rows may be rendered by JavaScript.")
+        return EMPTY_CALLS_TABLE
+
+    print(f"Target page loaded. {feed.url}")
+    stats = measure_overlap(mp3_urls, last_uploaded_filename)
+    pending = select_new_chunks(mp3_urls, last_uploaded_filename)
+    uploaded = upload_new_chunks(pending, upload_executor, http, s3, feed.audio_prefix, cache)
+    return uploaded, stats
+
+
+def scrape_feeds(db, feeds, email, password, cookies_file=COOKIES_FILE, driver_pool=None,
+                 max_feed_workers=SCRAPE_FEED_WORKERS, max_upload_workers=SCRAPE_UPLOAD_WORKERS, cache=None,
+                 leases=None):
+    """
+    Scrapes every feed in parallel, at most max_feed_workers at a time. All feeds share one
+    upload pool, one HTTP session and one S3 client.
+
+    Watermarks are read and results recorded on the calling thread, one transaction per feed,
+    since the sqlite connection cannot be shared across threads. If the saved session is
+    rejected, Selenium logs in once and only the rejected feeds are retried. Feeds whose calls
+    table comes back empty although they had calls before are scraped again with Selenium, in
+    case the rows are rendered by JavaScript. Uploaded chunks are also written to cache if one
+    is given.
+
+    If a LeaseManager is given, each feed is only scraped under its "scrape:<feed_id>" lease, so
+    several workers divide the feeds between them. Feeds leased by another worker are skipped and
+    the leases are released once the feeds are recorded.
+
+    :return: A dict of feed_id -> overlap stats of the feed's scrape (see measure_overlap),
+             with the number of chunks uploaded under "uploaded" for the feeds scraped over HTTP.
+    """
+    feed_leases = {}
+    if leases is not None:
+        for feed in feeds:
+            lease = leases.acquire(f"scrape:{feed.feed_id}")
+            if lease:
+                feed_leases[feed.feed_id] = lease
+            else:
+                print(f"{feed} is being scraped by another worker, skipping.")
+        feeds = [feed for feed in feeds if feed.feed_id in feed_leases]
+
+    # Read the watermarks after claiming the feeds, so they include the last holder's uploads
+    watermarks = {feed.feed_id: db.get_last_uploaded_filename(feed.feed_id) for feed in feeds}
+    feed_stats = {}
+
+    pool_size = max_feed_workers * max_upload_workers
+    http = s3_helper.create_http_session(pool_size)
+    s3 = s3_helper.create_s3_client(pool_size)
+
+    def run_round(round_feeds, upload_executor):
+        rejected = []
+        empty = []
+        with ThreadPoolExecutor(max_workers=max_feed_workers) as feed_executor:
+            futures = {
+                feed_executor.submit(
+                    scrape_feed, feed, watermarks[feed.feed_id], cookies_file, upload_executor, http, s3, cache
+                ): feed
+                for feed in round_feeds
+            }
+            for future in as_completed(futures):
+                feed = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Failed to scrape {feed}: {e}")
+                    continue
+
+                if result is None:
+                    rejected.append(feed)
+                    continue
+                if result == EMPTY_CALLS_TABLE:
+                    empty.append(feed)
+                    continue
+
+                # record the chunks, counter and new latest filename in one transaction
+                uploaded, stats = result
+                try:
+                    db.record_uploaded_chunks(uploaded, feed.feed_id, lease=feed_leases.get(feed.feed_id))
+                except LeaseLost as e:
+                    print(f"Not recording the scrape of {feed}: {e}")
+                    continue
+                stats["uploaded"] = len(uploaded)
+                feed_stats[feed.feed_id] = stats
+        return rejected, empty
+
+    try:
+        with ThreadPoolExecutor(max_workers=pool_size) as upload_executor:
+            rejected, empty = run_round(feeds, upload_executor)
+
+            # Log in again once for every feed whose session was rejected
+            if rejected:
+                print("Saved session rejected, logging in with Selenium...")
+                relogin(email, password, cookies_file, driver_pool)
+                rejected, retried_empty = run_round(rejected, upload_executor)
+                empty += retried_empty
+                for feed in rejected:
+                    print(f"Broadcastify rejected the session for {feed} after logging in.")
+
+        if empty:
+            feed_stats.update(scrape_with_browser(db, empty, email, password, driver_pool, cache, feed_leases))
+    finally:
+        http.close()
+        for lease in feed_leases.values():
+            leases.release(lease)
+
+    return feed_stats
+
+
+def scrape_with_browser(db, feeds, email, password, driver_pool=None, cache=None, feed_leases=None):
+    """
+    Scrapes feeds one by one with Selenium, on a driver from driver_pool or a fresh one.
+
+    :return: A dict of feed_id -> overlap stats of the feed's scrape.
+    """
+    feed_leases = feed_leases or {}
+    feed_stats = {}
+
+    def run(driver):
+        for feed in feeds:
+            print(f"Scraping {feed} with Selenium...")
+            try:
+                stats = run_broadcastify_job(driver, db, email, password, feed, cache, feed_leases.get(feed.feed_id))
+            except Exception as e:
+                print(f"Failed to scrape {feed} with Selenium: {e}")
+                continue
+            if stats is not None:
+                feed_stats[feed.feed_id] = stats
+
+    if driver_pool is not None:
+        with driver_pool.acquire() as driver:
+            run(driver)
+    else:
+        driver = setup_chrome_driver()
+        try:
+            run(driver)
+        finally:
+            driver.quit()
+    return feed_stats
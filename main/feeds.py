@@ -0,0 +1,59 @@
+import os
+
+from context import S3_AUDIO_PATH, BROADCASTIFY_CALLS_URL, DEFAULT_FEED_SYSTEM_ID, DEFAULT_FEED_ID
+
+
+class Feed:
+    """
+    A Broadcastify talkgroup being monitored. Each feed keeps its own watermark and counter
+    in the feed_state table and uploads its chunks under its own S3 prefix.
+    """
+
+    def __init__(self, system_id: str, feed_id: str, name: str = None):
+        self.system_id = str(system_id)
+        self.feed_id = str(feed_id)
+        self.name = name or self.feed_id
+
+    @property
+    def url(self) -> str:
+        """
+        The calls page for this talkgroup.
+        """
+        return f"{BROADCASTIFY_CALLS_URL}{self.system_id}/{self.feed_id}"
+
+    @property
+    def audio_prefix(self) -> str:
+        """
+        The S3 prefix this feed's chunks are uploaded to, e.g. 'audio-files/1311/'.
+        """
+        return f"{S3_AUDIO_PATH}{self.feed_id}/"
+
+    def __repr__(self):
+        return f"Feed({self.system_id}/{self.feed_id})"
+
+
+def load_feeds():
+    """
+    Builds the feed registry from the BROADCASTIFY_FEEDS environment variable, a comma separated
+    list of system/talkgroup pairs with an optional name, e.g. "6957/1311=Herndon PD,6957/1312".
+    Falls back to the default Herndon talkgroup when the variable is not set.
+
+    Returns:
+        list[Feed]: The feeds to scrape.
+    """
+    raw = os.getenv("BROADCASTIFY_FEEDS", "").strip()
+    if not raw:
+        return [Feed(DEFAULT_FEED_SYSTEM_ID, DEFAULT_FEED_ID)]
+
+    feeds = []
+    for entry in raw.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        path, _, name = entry.partition("=")
+        try:
+            system_id, feed_id = path.strip().strip("/").split("/")
+        except ValueError:
+            raise ValueError(f"Invalid feed '{entry}', expected 'system/talkgroup'.")
+        feeds.append(Feed(system_id, feed_id, name.strip() or None))
+    return feeds
@@ -1,26 +1,147 @@
 import boto3
+import hashlib
 import io
+import json
+import subprocess
+import tempfile
 import time
 
+from boto3.s3.transfer import TransferConfig
+
+from botocore.config import Config
 from botocore.exceptions import ClientError, BotoCoreError
 
 from pydub import AudioSegment
 
+from main.encode_profiles import encode, get_profile
+from main.helpers.mp3_frames import Mp3Concatenator, Mp3FormatError
+from main.helpers.s3 import s3_helper
+from main.helpers.s3.prefetch import prefetch_objects
+from main.leases import LeaseLost
+from main.silence import trim_silence
 from config import AWS_ACCESS_KEY_ID, REGION_NAME, BUCKET_NAME, AWS_SECRET_ACCESS_KEY
-from context import S3_AUDIO_PATH, S3_GLUED_AUDIO_PATH
+from context import (S3_AUDIO_PATH, S3_CONTENT_HASH_METADATA, S3_GLUED_AUDIO_PATH, S3_GLUED_OFFSETS_PATH, GLUE_PREFETCH_WINDOW, GLUE_MEMORY_CEILING_BYTES,
+                     GLUE_MULTIPART_CHUNK_BYTES, GLUE_MAX_CHUNKS, SILENCE_TRIM_ENABLED, GLUE_ENCODE_PROFILE)
+
+
+def decode_and_glue(chunks):
+    """
+    Fallback for chunks that cannot be concatenated at the byte level (e.g. mismatched sample
+    rates): decodes each chunk with pydub, converts it to the first chunk's sample rate and
+    channels, and streams the PCM into a single ffmpeg encode. Only one decoded chunk is held
+    in memory at a time and the encoded MP3 is written to a temporary file on disk.
+
+    :param chunks: Iterable of (key, mp3 bytes) tuples in play order.
+    :return: A temporary file holding the glued MP3, or None if there was nothing to glue.
+    """
+    output = tempfile.TemporaryFile()
+    process = None
+    try:
+        for _, data in chunks:
+            segment = AudioSegment.from_file(io.BytesIO(data), format="mp3")
+            if process is None:
+                frame_rate, channels = segment.frame_rate, segment.channels
+                process = subprocess.Popen(
+                    [AudioSegment.converter, "-y", "-f", "s16le", "-ar", str(frame_rate), "-ac", str(channels),
+                     "-i", "pipe:0", "-f", "mp3", "pipe:1"],
+                    stdin=subprocess.PIPE, stdout=output, stderr=subprocess.DEVNULL
+                )
+            segment = segment.set_frame_rate(frame_rate).set_channels(channels).set_sample_width(2)
+            process.stdin.write(segment.raw_data)
+    except Exception:
+        if process is not None:
+            process.kill()
+        output.close()
+        raise
+    finally:
+        if process is not None:
+            process.stdin.close()
+            process.wait()
+
+    if process is None:
+        output.close()
+        return None
+    if process.returncode != 0:
+        output.close()
+        raise RuntimeError(f"ffmpeg exited with code {process.returncode} while gluing.")
+
+    output.seek(0)
+    return output
+
+
+def seed_manifest(db, s3=None):
+    """
+    Seeds the uploaded chunk manifest from the chunks actually under S3_AUDIO_PATH the first time
+    it runs, so chunks uploaded before the manifest existed are glued rather than orphaned.
+    """
+    if db.is_manifest_seeded():
+        return 0
+    keys = [key for key in s3_helper.list_keys(S3_AUDIO_PATH, s3) if key.endswith(".mp3")]
+    return db.seed_manifest(keys)
+
+
+def skip_missing(chunks, missing):
+    """
+    Passes the prefetched chunks through, leaving out the keys that no longer exist in S3 and
+    collecting them in missing.
+    """
+    for key, data in chunks:
+        if data is None:
+            print(f"{key} is missing from S3, skipping it.")
+            missing.append(key)
+            continue
+        yield key, data
 
 
-def glue():
+def sha256_file(file):
     """
-    Downloads all MP3 files from a specific S3 folder into memory, sorts them by the integer
-    prefix in the filename, concatenates them into one MP3, and uploads the glued MP3 to S3.
+    Returns the hex sha256 of a file-like object's contents and rewinds it.
+    """
+    digest = hashlib.sha256()
+    file.seek(0)
+    for block in iter(lambda: file.read(1024 * 1024), b""):
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def glue(db, prefetch_window=GLUE_PREFETCH_WINDOW, memory_ceiling=GLUE_MEMORY_CEILING_BYTES,
+         remove_silence=SILENCE_TRIM_ENABLED, max_chunks=GLUE_MAX_CHUNKS, flush_reason=None,
+         cache=None, encode_profile=GLUE_ENCODE_PROFILE, lease=None, flush_policy=None):
+    """
+    Takes the oldest pending chunks (at most max_chunks) from the uploaded chunk manifest,
+    concatenates their MP3 frames into one MP3 and uploads the glued MP3 to S3. On success exactly
+    those chunks are marked as glued and deleted from S3, so chunks uploaded while gluing are
+    left for the next batch. If a FlushPolicy is given, the batch is also kept within its chunk,
+    audio duration and size limits, and the rest is left for the next batch.
+
+    Chunks are prefetched concurrently, prefetch_window at a time, and concatenated in order as
+    they arrive. Chunks are only decoded and re-encoded when their formats do not match.
+
+    The glued audio is streamed into a temporary file that stays in memory up to half of
+    memory_ceiling and spills to disk beyond it, then streamed to S3 as a multipart upload
+    whose in-flight parts use the other half. Peak memory does not grow with the batch size.
+
+    If remove_silence is set, dead air is cut out before upload (this decodes the batch) and the
+    offset map back to the untrimmed audio is uploaded next to it under S3_GLUED_OFFSETS_PATH.
+
+    flush_reason is the FlushPolicy trigger that started the batch, recorded with its latency.
+    If a ChunkCache is given, chunks are read from it first and only misses are downloaded.
+    Chunks that no longer exist in S3 are skipped and quarantined instead of failing the batch.
+
+    The glued audio is stored in the format of encode_profile (see encode_profiles), e.g. 16 kHz
+    mono FLAC, and the file extension tells transcribe() which MediaFormat to submit. The sha256 of
+    the glued audio before encoding is stored in the object's metadata so transcribe() can reuse the
+    transcript of audio that was glued twice.
+
+    If the glue lease is given and lost before the chunks are marked as glued, the glued upload is
+    deleted and the chunks are left for whichever worker holds the lease now (see main.leases).
     """
 
     aws_access_key_id = AWS_ACCESS_KEY_ID
     aws_secret_access_key = AWS_SECRET_ACCESS_KEY
     region_name = REGION_NAME
     bucket = BUCKET_NAME
-    audio_path = S3_AUDIO_PATH
     glued_path = S3_GLUED_AUDIO_PATH
 
     # Initialize S3 client
@@ -28,72 +149,125 @@ def glue():
         "s3",
         aws_access_key_id=aws_access_key_id,
         aws_secret_access_key=aws_secret_access_key,
-        region_name=region_name
+        region_name=region_name,
+        config=Config(max_pool_connections=prefetch_window)
     )
 
-    # List all objects in the given prefix
-    response = s3.list_objects_v2(Bucket=bucket, Prefix=audio_path)
-    if 'Contents' not in response:
-        print(f"No objects found under prefix {audio_path}")
-        return False
-
-    # Filter for MP3 files
-    mp3_keys = [obj['Key'] for obj in response['Contents'] if obj['Key'].endswith('.mp3')]
+    # Read the exact slice of chunks to glue from the manifest, oldest first
+    max_audio_seconds = max_bytes = None
+    if flush_policy is not None:
+        if flush_policy.max_chunks is not None:
+            max_chunks = min(max_chunks, flush_policy.max_chunks)
+        max_audio_seconds = flush_policy.max_audio_seconds
+        max_bytes = flush_policy.max_bytes
+    mp3_keys = db.get_pending_chunks(max_chunks, max_audio_seconds, max_bytes)
 
     if not mp3_keys:
         print("No MP3 files to download and glue.")
         return False
 
-    # Parse the filenames to extract the numeric prefix for sorting
-    # Assuming filenames like "1734125390-1311.mp3"
-    def extract_sort_key(key):
-        filename = key.split('/')[-1]  # get the file name from the key
-        base_name = filename.rsplit('.', 1)[0]  # remove extension
-        numeric_part = base_name.split('-')[0]   # "1734125390"
-        return int(numeric_part) if numeric_part.isdigit() else float('inf')
+    print("Gluing...")
+    # Concatenate the MP3 frames directly as the prefetched chunks arrive,
+    # falling back to decoding if the formats differ
+    glued_file = tempfile.SpooledTemporaryFile(max_size=memory_ceiling // 2)
+    missing = []
+    try:
+        concatenator = Mp3Concatenator(glued_file)
+        for mp3_key, data in skip_missing(prefetch_objects(s3, mp3_keys, prefetch_window, bucket, cache), missing):
+            concatenator.add(data, mp3_key)
+        glued_file.seek(0)
+        print(f"Concatenated {concatenator.frames} frames ({concatenator.duration_seconds:.0f}s of audio).")
+        if not concatenator.frames:
+            glued_file.close()
+            glued_file = None
+    except Mp3FormatError as e:
+        print(f"{e} Falling back to decoding with pydub.")
+        glued_file.close()
+        missing = []
+        glued_file = decode_and_glue(
+            skip_missing(prefetch_objects(s3, mp3_keys, prefetch_window, bucket, cache), missing)
+        )
 
-    mp3_keys.sort(key=extract_sort_key)
+    # Chunks missing from S3 would otherwise head every batch from now on
+    db.quarantine_chunks(missing)
+    missing = set(missing)
+    mp3_keys = [key for key in mp3_keys if key not in missing]
 
-    print("Gluing...")
-    # Download each MP3 into memory and concatenate using pydub
-    combined_audio = None
-    for mp3_key in mp3_keys:
-        # Download MP3 into memory
-        mp3_obj = io.BytesIO()
-        s3.download_fileobj(BUCKET_NAME, mp3_key, mp3_obj)
-        mp3_obj.seek(0)
-
-        # Create an AudioSegment
-        segment = AudioSegment.from_file(mp3_obj, format="mp3")
-
-        if combined_audio is None:
-            combined_audio = segment
-        else:
-            combined_audio += segment
-
-    if combined_audio is None:
+    if glued_file is None:
         print("No audio segments found to combine.")
         return False
 
-    # Generate a new filename using the current epoch timestamp
-    glued_filename = f"{int(time.time())}-glued.mp3"
+    # Cut out silence so Transcribe is not billed for dead air
+    offset_map = None
+    trimmed_seconds = 0.0
+    if remove_silence:
+        trimmed_file, offset_map, trimmed_seconds = trim_silence(glued_file)
+        if trimmed_file is not glued_file:
+            glued_file.close()
+            glued_file = trimmed_file
 
-    # Export the combined audio to memory
-    glued_buffer = io.BytesIO()
-    combined_audio.export(glued_buffer, format="mp3")
-    glued_buffer.seek(0)
+    # Hash the audio before encoding: encoders such as ffmpeg's Ogg muxer are not bit-exact across
+    # runs, so the same chunks would hash differently after encoding and never hit the cache
+    content_hash = sha256_file(glued_file)
+
+    # Encode the glued audio in the configured profile
+    profile = get_profile(encode_profile)
+    try:
+        encoded_file = encode(glued_file, profile)
+    except RuntimeError as e:
+        print(f"{e} Uploading the glued MP3 as is.")
+        profile = get_profile("mp3")
+        glued_file.seek(0)
+        encoded_file = glued_file
+    if encoded_file is not glued_file:
+        glued_file.close()
+        glued_file = encoded_file
+
+    # Generate a new filename using the current epoch timestamp
+    glued_timestamp = int(time.time())
+    glued_filename = f"{glued_timestamp}-glued{profile.extension}"
 
     # Upload the glued MP3 to S3
     final_s3_key = f"{glued_path}{glued_filename}"
 
+    # Keep the in-flight multipart parts within the other half of the memory ceiling
+    part_size = min(GLUE_MULTIPART_CHUNK_BYTES, max(memory_ceiling // 2, 5 * 1024 * 1024))
+    transfer_config = TransferConfig(
+        multipart_threshold=part_size,
+        multipart_chunksize=part_size,
+        max_concurrency=max(1, (memory_ceiling // 2) // part_size)
+    )
+
     try:
-        s3.upload_fileobj(glued_buffer, bucket, final_s3_key)
-        print(f"Glued MP3 uploaded to s3://{bucket}/{final_s3_key}")
-        return True
+        s3.upload_fileobj(
+            glued_file, bucket, final_s3_key,
+            ExtraArgs={"Metadata": {S3_CONTENT_HASH_METADATA: content_hash}},
+            Config=transfer_config
+        )
+        print(f"Glued {profile.name} audio uploaded to s3://{bucket}/{final_s3_key}")
+        if offset_map:
+            s3.put_object(
+                Bucket=bucket,
+                Key=f"{S3_GLUED_OFFSETS_PATH}{glued_timestamp}-glued.json",
+                Body=json.dumps({"offset_map": offset_map, "trimmed_seconds": trimmed_seconds}),
+                ContentType="application/json"
+            )
     except (BotoCoreError, ClientError) as e:
         print(f"Failed to upload glued file: {e}")
         return False
+    finally:
+        glued_file.close()
 
-
-
-
+    # Retire exactly the glued chunks
+    try:
+        db.mark_chunks_glued(mp3_keys, glued_timestamp, flush_reason, lease=lease)
+    except LeaseLost as e:
+        # Drop the upload too, or its audio would be transcribed twice
+        print(f"Not retiring the glued chunks: {e}")
+        s3_helper.delete_keys([final_s3_key, f"{S3_GLUED_OFFSETS_PATH}{glued_timestamp}-glued.json"], s3)
+        return False
+    s3_helper.delete_keys(mp3_keys, s3)
+    if cache is not None:
+        cache.discard(mp3_keys)
+        print(f"Chunk cache: {cache.stats()}")
+    return True
@@ -0,0 +1,117 @@
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from context import CHUNK_CACHE_MAX_BYTES
+
+
+class ChunkCache:
+    """
+    A size-bounded local disk cache of uploaded chunks, keyed by chunk filename, so the gluer
+    can read chunks the scraper just uploaded without downloading them back from S3.
+
+    The least recently used chunks are evicted once the cache grows past max_bytes. Files already
+    in the directory are picked up on startup, oldest first. Safe to share between threads.
+    """
+
+    def __init__(self, directory=None, max_bytes=CHUNK_CACHE_MAX_BYTES):
+        if directory is None:
+            directory = Path("~/Radio Summary/chunk-cache").expanduser()
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Index what an earlier run left behind, least recently used first
+        for path in sorted(self.directory.glob("*.mp3"), key=lambda p: p.stat().st_mtime):
+            self._entries[path.name] = path.stat().st_size
+            self.size_bytes += path.stat().st_size
+        with self._lock:
+            self._evict()
+
+    def put(self, filename, data):
+        """
+        Stores a chunk, evicting the least recently used chunks if the cache is full.
+        Chunks larger than the whole cache are not stored.
+        """
+        filename = os.path.basename(filename)
+        if len(data) > self.max_bytes:
+            return
+
+        # Write to a temporary name first so readers never see a partial file
+        path = self.directory / filename
+        temp_path = path.with_name(f".{filename}.{threading.get_ident()}.tmp")
+        temp_path.write_bytes(data)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            self.size_bytes -= self._entries.pop(filename, 0)
+            self._entries[filename] = len(data)
+            self.size_bytes += len(data)
+            self._evict()
+
+    def get(self, filename):
+        """
+        Returns the cached chunk's bytes, or None on a miss.
+        """
+        filename = os.path.basename(filename)
+        with self._lock:
+            if filename not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(filename)
+
+        try:
+            data = (self.directory / filename).read_bytes()
+        except FileNotFoundError:
+            # Evicted or removed between the lookup and the read
+            with self._lock:
+                self.size_bytes -= self._entries.pop(filename, 0)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def discard(self, filenames):
+        """
+        Removes chunks that will not be read again, e.g. once they have been glued.
+        """
+        with self._lock:
+            for filename in filenames:
+                filename = os.path.basename(filename)
+                if filename in self._entries:
+                    self.size_bytes -= self._entries.pop(filename)
+                    self._remove_file(filename)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self.size_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else None,
+            }
+
+    def _evict(self):
+        while self.size_bytes > self.max_bytes and self._entries:
+            filename, size = self._entries.popitem(last=False)
+            self.size_bytes -= size
+            self.evictions += 1
+            self._remove_file(filename)
+
+    def _remove_file(self, filename):
+        try:
+            (self.directory / filename).unlink()
+        except FileNotFoundError:
+            pass
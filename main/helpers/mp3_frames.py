@@ -0,0 +1,220 @@
+# Bitrates in kbps, indexed by [version is MPEG-1][layer][bitrate index]
+BITRATES = {
+    True: {
+        1: [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+        2: [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+        3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    },
+    False: {
+        1: [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+        2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+        3: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    },
+}
+
+# Sample rates in Hz, indexed by version bits then sample rate index
+SAMPLE_RATES = {
+    0b11: [44100, 48000, 32000],  # MPEG-1
+    0b10: [22050, 24000, 16000],  # MPEG-2
+    0b00: [11025, 12000, 8000],   # MPEG-2.5
+}
+
+
+class Mp3FormatError(Exception):
+    """
+    Raised when a chunk cannot be concatenated at the byte level.
+    """
+
+
+class FrameHeader:
+    """
+    A parsed 4 byte MPEG audio frame header.
+    """
+
+    def __init__(self, version_bits, layer, bitrate_kbps, sample_rate, padding, channel_mode):
+        self.version_bits = version_bits
+        self.layer = layer
+        self.bitrate_kbps = bitrate_kbps
+        self.sample_rate = sample_rate
+        self.padding = padding
+        self.channel_mode = channel_mode
+
+    @property
+    def is_mpeg1(self):
+        return self.version_bits == 0b11
+
+    @property
+    def is_mono(self):
+        return self.channel_mode == 0b11
+
+    @property
+    def samples_per_frame(self):
+        if self.layer == 1:
+            return 384
+        if self.layer == 3 and not self.is_mpeg1:
+            return 576
+        return 1152
+
+    @property
+    def frame_length(self):
+        if self.layer == 1:
+            return (12 * self.bitrate_kbps * 1000 // self.sample_rate + self.padding) * 4
+        return self.samples_per_frame // 8 * self.bitrate_kbps * 1000 // self.sample_rate + self.padding
+
+    @property
+    def stream_format(self):
+        """
+        The properties every frame of a glued stream must share. Stereo, joint stereo and dual
+        channel frames can follow each other, but mono frames cannot be mixed with them.
+        """
+        return self.version_bits, self.layer, self.sample_rate, self.is_mono
+
+
+def parse_frame_header(data, offset):
+    """
+    Parses the frame header at offset, returning None if there is no valid header there.
+    """
+    if offset + 4 > len(data):
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    if data[offset] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version_bits = (b1 >> 3) & 0b11
+    layer_bits = (b1 >> 1) & 0b11
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 0b11
+    if version_bits == 0b01 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    layer = 4 - layer_bits
+    is_mpeg1 = version_bits == 0b11
+    return FrameHeader(
+        version_bits=version_bits,
+        layer=layer,
+        bitrate_kbps=BITRATES[is_mpeg1][layer][bitrate_index],
+        sample_rate=SAMPLE_RATES[version_bits][sample_rate_index],
+        padding=(b2 >> 1) & 1,
+        channel_mode=b3 >> 6,
+    )
+
+
+def _skip_id3v2(data):
+    offset = 0
+    # A file can start with several ID3v2 tags
+    while data[offset:offset + 3] == b"ID3" and offset + 10 <= len(data):
+        flags = data[offset + 5]
+        size = 0
+        for byte in data[offset + 6:offset + 10]:
+            size = (size << 7) | (byte & 0x7F)
+        offset += 10 + size + (10 if flags & 0x10 else 0)
+    return offset
+
+
+def _audio_end(data):
+    end = len(data)
+    # ID3v1 tag at the very end
+    if end >= 128 and data[end - 128:end - 125] == b"TAG":
+        end -= 128
+    # APEv2 tag footer
+    if end >= 32 and data[end - 32:end - 24] == b"APETAGEX":
+        tag_size = int.from_bytes(data[end - 20:end - 16], "little")
+        has_header = data[end - 9] & 0x80
+        end -= tag_size + (32 if has_header else 0)
+    return max(end, 0)
+
+
+def _is_vbr_header_frame(data, offset, header):
+    if header.layer != 3:
+        return False
+    if header.is_mpeg1:
+        side_info = 17 if header.is_mono else 32
+    else:
+        side_info = 9 if header.is_mono else 17
+    tag_offset = offset + 4 + side_info
+    if data[tag_offset:tag_offset + 4] in (b"Xing", b"Info"):
+        return True
+    return data[offset + 36:offset + 40] == b"VBRI"
+
+
+def iter_frames(data):
+    """
+    Yields (offset, header) for every audio frame in an MP3 file, skipping tags, the
+    Xing/Info/VBRI header frame and any junk between frames.
+    """
+    offset = _skip_id3v2(data)
+    end = _audio_end(data)
+    first = True
+
+    while offset + 4 <= end:
+        header = parse_frame_header(data, offset)
+        if header is None or header.frame_length <= 4 or offset + header.frame_length > end:
+            # Resynchronise on the next frame sync
+            offset = data.find(b"\xff", offset + 1, end)
+            if offset == -1:
+                return
+            continue
+
+        if not (first and _is_vbr_header_frame(data, offset, header)):
+            yield offset, header
+        first = False
+        offset += header.frame_length
+
+
+class Mp3Concatenator:
+    """
+    Concatenates MP3 chunks at the frame level into a writable file-like object.
+
+    Every chunk must share the MPEG version, layer, sample rate and mono or not of the first one,
+    otherwise Mp3FormatError is raised and the caller should fall back to decoding.
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self.stream_format = None
+        self.frames = 0
+        self.samples = 0
+        self.bytes_written = 0
+
+    def add(self, data, name="chunk"):
+        frames = list(iter_frames(data))
+        if not frames:
+            raise Mp3FormatError(f"No MP3 frames found in {name}.")
+
+        for _, header in frames:
+            if self.stream_format is None:
+                self.stream_format = header.stream_format
+            elif header.stream_format != self.stream_format:
+                raise Mp3FormatError(
+                    f"{name} is {_describe(header.stream_format)}, expected {_describe(self.stream_format)}."
+                )
+
+        view = memoryview(data)
+        for offset, header in frames:
+            self.output.write(view[offset:offset + header.frame_length])
+            self.bytes_written += header.frame_length
+            self.frames += 1
+            self.samples += header.samples_per_frame
+
+    @property
+    def duration_seconds(self):
+        if not self.stream_format:
+            return 0.0
+        return self.samples / self.stream_format[2]
+
+
+def _describe(stream_format):
+    _, layer, sample_rate, is_mono = stream_format
+    return f"{sample_rate} Hz layer {layer} {'mono' if is_mono else 'stereo'}"
+
+
+def mp3_duration_seconds(data):
+    """
+    Returns the duration of an MP3 file from its frame headers, without decoding it.
+    """
+    samples = 0
+    sample_rate = None
+    for _, header in iter_frames(data):
+        samples += header.samples_per_frame
+        sample_rate = sample_rate or header.sample_rate
+    return samples / sample_rate if sample_rate else 0.0
@@ -0,0 +1,68 @@
+import io
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from config import BUCKET_NAME
+from context import GLUE_PREFETCH_WINDOW
+
+
+def _download(s3, bucket, key, cache=None):
+    start = time.monotonic()
+    if cache is not None:
+        data = cache.get(key)
+        if data is not None:
+            return data, time.monotonic() - start
+    buffer = io.BytesIO()
+    try:
+        s3.download_fileobj(bucket, key, buffer)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey"):
+            raise
+        return None, time.monotonic() - start
+    return buffer.getvalue(), time.monotonic() - start
+
+
+def prefetch_objects(s3, keys, window=GLUE_PREFETCH_WINDOW, bucket=BUCKET_NAME, cache=None):
+    """
+    Downloads S3 objects concurrently, at most window ahead of the consumer, and yields them
+    in the order of keys so network time overlaps with processing.
+
+    Each chunk's fetch time and how long the consumer had to wait for it are logged; if the
+    waits stay high, the window is too small.
+
+    :param s3: An S3 client whose connection pool holds at least window connections.
+    :param keys: The keys to download, in the order they should be yielded.
+    :param cache: Optional ChunkCache checked by filename before downloading, S3 is used on a miss.
+    :return: A generator of (key, bytes) tuples. bytes is None for a key that does not exist.
+    """
+    keys = iter(keys)
+    with ThreadPoolExecutor(max_workers=window) as executor:
+        pending = deque()
+        for _ in range(window):
+            key = next(keys, None)
+            if key is None:
+                break
+            pending.append((key, executor.submit(_download, s3, bucket, key, cache)))
+
+        try:
+            while pending:
+                key, future = pending.popleft()
+                wait_start = time.monotonic()
+                data, fetch_seconds = future.result()
+                waited = time.monotonic() - wait_start
+                if data is not None:
+                    print(f"Fetched {key}: {len(data)} bytes in {fetch_seconds:.3f}s (waited {waited:.3f}s)")
+
+                # Keep the window full
+                next_key = next(keys, None)
+                if next_key is not None:
+                    pending.append((next_key, executor.submit(_download, s3, bucket, next_key, cache)))
+
+                yield key, data
+        finally:
+            # The consumer stopped early, don't download the rest
+            for _, future in pending:
+                future.cancel()
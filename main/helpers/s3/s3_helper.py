@@ -3,11 +3,14 @@ from io import BytesIO
 
 import boto3
 import requests
+from botocore.config import Config
 from botocore.exceptions import ClientError, NoCredentialsError
+from requests.adapters import HTTPAdapter
 
-from context import S3_FULL_TEXT_PATH, S3_SUMMARY_TEXT_PATH, S3_HTML_PATH
+from context import S3_AUDIO_PATH, S3_FULL_TEXT_PATH, S3_SUMMARY_TEXT_PATH, S3_HTML_PATH
 from config import AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, REGION_NAME, BUCKET_NAME
 from main.helpers import filename_helper
+from main.helpers.mp3_frames import mp3_duration_seconds
 
 
 def upload_full_text_transcript(text):
@@ -36,35 +39,72 @@ def upload_full_text_transcript(text):
     except Exception as e:
         print(f"Failed to upload text to S3: {e}")
 
-def upload_mp3_to_s3(url):
+def create_s3_client(max_pool_connections=None):
+    """
+    Creates an S3 client. boto3 clients are thread-safe, so a single client can be shared
+    by every worker of a thread pool.
+
+    :param max_pool_connections: Size of the client's connection pool, should match the number of workers.
+    """
+    config = Config(max_pool_connections=max_pool_connections) if max_pool_connections else None
+    return boto3.client(
+        "s3",
+        aws_access_key_id=AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+        region_name=REGION_NAME,
+        config=config
+    )
+
+def create_http_session(pool_size=10):
+    """
+    Creates a requests session with a connection pool large enough for pool_size concurrent downloads.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def upload_mp3_to_s3(url, session=None, s3=None, prefix=S3_AUDIO_PATH, cache=None):
     """
     Downloads an MP3 file from the given URL and uploads it to the specified S3 bucket.
 
     :param url: URL of the MP3 file to download.
+    :param session: Optional shared requests session, a plain requests.get is used if omitted.
+    :param s3: Optional shared S3 client, a new client is created if omitted.
+    :param prefix: The S3 prefix to upload under, e.g. a feed's 'audio-files/1311/'.
+    :param cache: Optional ChunkCache the uploaded chunk is also written to, so gluing can skip S3.
+    :return: A dict with the chunk's filename, s3_key, size_bytes and duration_seconds, or None on failure.
     """
+    http = session or requests
     try:
         # Step 1: Download the MP3 file from the URL
-        response = requests.get(url, stream=True)
-        response.raise_for_status()  # Raise an exception for HTTP errors
+        with http.get(url, timeout=30) as response:
+            response.raise_for_status()  # Raise an exception for HTTP errors
+            data = response.content
         print(f"Downloaded MP3 file from {url}, beginning upload to s3...")
 
         # prep s3 client
-        s3 = boto3.client(
-            "s3",
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            region_name=REGION_NAME
-        )
-        s3_key = "audio-files/" + filename_helper.extract_filename_from_url(url)
+        if s3 is None:
+            s3 = create_s3_client()
+        filename = filename_helper.extract_filename_from_url(url)
+        s3_key = prefix + filename
 
         # upload to s3
-        s3.upload_fileobj(response.raw, BUCKET_NAME, s3_key)
+        s3.upload_fileobj(BytesIO(data), BUCKET_NAME, s3_key)
         print(f"Uploaded MP3 file to s3://{BUCKET_NAME}/{s3_key}")
-        return True
+        if cache is not None:
+            cache.put(filename, data)
+        return {
+            "filename": filename,
+            "s3_key": s3_key,
+            "size_bytes": len(data),
+            "duration_seconds": mp3_duration_seconds(data)
+        }
 
     except requests.exceptions.RequestException as e:
         print(f"Failed to upload chunked MP3 file to s3: {e}")
-        return False
+        return None
 
 def file_exists_in_s3(s3_key):
     """
@@ -133,6 +173,45 @@ def delete_directory_files():
     except ClientError as e:
         print(f"Failed to delete files in {directory_prefix}: {e}")
 
+def list_keys(prefix, s3=None):
+    """
+    Lists every key under prefix in the S3 bucket, following pagination.
+    """
+    if s3 is None:
+        s3 = create_s3_client()
+
+    keys = []
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=BUCKET_NAME, Prefix=prefix):
+        keys.extend(obj["Key"] for obj in page.get("Contents", []))
+    return keys
+
+def delete_keys(keys, s3=None):
+    """
+    Deletes exactly the given keys from the S3 bucket, 1000 per request.
+
+    :param keys: The S3 keys to delete.
+    :return: True if every key was deleted.
+    """
+    if s3 is None:
+        s3 = create_s3_client()
+
+    all_deleted = True
+    try:
+        for i in range(0, len(keys), 1000):
+            chunk = [{"Key": key} for key in keys[i:i + 1000]]
+            response = s3.delete_objects(
+                Bucket=BUCKET_NAME,
+                Delete={"Objects": chunk, "Quiet": True}
+            )
+            for error in response.get("Errors", []):
+                all_deleted = False
+                print(f"Failed to delete {error['Key']}: {error['Message']}")
+        print(f"Deleted {len(keys)} files.")
+    except ClientError as e:
+        print(f"Failed to delete files: {e}")
+        return False
+    return all_deleted
+
 def upload_html_to_s3(content: str) -> bool:
     # Generate HTML document
 
@@ -0,0 +1,137 @@
+import os
+import socket
+import time
+from contextlib import contextmanager
+
+from context import LEASE_TTL_SECONDS
+
+
+class LeaseLost(RuntimeError):
+    """
+    Raised when a lease expired or was taken over by another worker before its holder finished.
+    """
+
+
+class Lease:
+    """
+    A named lease held by owner until expires_at (epoch seconds). token is the fencing token:
+    it grows every time the lease changes hands, so a write fenced with an older token is refused.
+    """
+
+    __slots__ = ("name", "owner", "token", "expires_at")
+
+    def __init__(self, name, owner, token, expires_at):
+        self.name = name
+        self.owner = owner
+        self.token = token
+        self.expires_at = expires_at
+
+    def __repr__(self):
+        return f"Lease({self.name!r}, owner={self.owner!r}, token={self.token})"
+
+
+def default_worker_id():
+    """
+    The WORKER_ID environment variable, or host and process id, so every replica has its own identity.
+    """
+    return os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+def check_fence(conn, lease):
+    """
+    Raises LeaseLost unless lease is still the current holder of its name. Call it inside the
+    transaction of a write made under the lease, so the check and the write commit together.
+    """
+    row = conn.execute("SELECT owner, token, expires_at FROM lease WHERE name = ?;", (lease.name,)).fetchone()
+    if not row or row[0] != lease.owner or row[1] != lease.token or row[2] <= time.time():
+        raise LeaseLost(f"{lease} is no longer held.")
+
+
+class LeaseManager:
+    """
+    Hands out expiring leases stored in the lease table, so several workers sharing one database
+    divide the pipeline's work instead of duplicating it. Each unit of work (a feed to scrape,
+    the glue stage, a glued file to transcribe) is claimed by name and skipped by every other
+    worker while the lease is held.
+
+    Leases expire after ttl_seconds unless renewed, so the work of a crashed worker is picked up
+    by another one. Writes made under a lease are fenced with check_fence.
+
+    Leases live in SQLite, so the workers must share the database file (processes or containers
+    on one host with a shared volume).
+    """
+
+    def __init__(self, db, owner=None, ttl_seconds=LEASE_TTL_SECONDS):
+        self.db = db
+        self.owner = owner or default_worker_id()
+        self.ttl_seconds = ttl_seconds
+
+    def acquire(self, name, ttl_seconds=None):
+        """
+        Claims the lease on name, or extends it if this worker already holds it.
+
+        :return: The Lease, or None if another worker holds it.
+        """
+        now = time.time()
+        expires_at = now + (ttl_seconds or self.ttl_seconds)
+        with self.db.transaction() as conn:
+            row = conn.execute("SELECT owner, token, expires_at FROM lease WHERE name = ?;", (name,)).fetchone()
+            if row is None:
+                token = 1
+                conn.execute(
+                    "INSERT INTO lease (name, owner, token, expires_at) VALUES (?, ?, ?, ?);",
+                    (name, self.owner, token, expires_at)
+                )
+                return Lease(name, self.owner, token, expires_at)
+
+            owner, token, current_expires_at = row
+            if current_expires_at > now and owner != self.owner:
+                return None
+            if current_expires_at <= now or owner != self.owner:
+                token += 1
+            conn.execute(
+                "UPDATE lease SET owner = ?, token = ?, expires_at = ? WHERE name = ?;",
+                (self.owner, token, expires_at, name)
+            )
+        return Lease(name, self.owner, token, expires_at)
+
+    def renew(self, lease, ttl_seconds=None):
+        """
+        Extends a held lease.
+
+        :raises LeaseLost: If the lease expired or changed hands.
+        """
+        expires_at = time.time() + (ttl_seconds or self.ttl_seconds)
+        with self.db.transaction() as conn:
+            check_fence(conn, lease)
+            conn.execute("UPDATE lease SET expires_at = ? WHERE name = ?;", (expires_at, lease.name))
+        lease.expires_at = expires_at
+        return lease
+
+    def release(self, lease):
+        """
+        Gives a lease up early. The token is kept, so the next holder gets a higher one.
+        """
+        with self.db.transaction() as conn:
+            conn.execute(
+                "UPDATE lease SET expires_at = 0 WHERE name = ? AND owner = ? AND token = ?;",
+                (lease.name, lease.owner, lease.token)
+            )
+
+    @contextmanager
+    def hold(self, name, ttl_seconds=None):
+        """
+        Claims name for the duration of the block and releases it afterwards. Yields the Lease,
+        or None if another worker holds it.
+
+        Usage:
+            with leases.hold("glue") as lease:
+                if lease:
+                    ...
+        """
+        lease = self.acquire(name, ttl_seconds)
+        try:
+            yield lease
+        finally:
+            if lease:
+                self.release(lease)
@@ -1,5 +1,11 @@
 import os
 import pickle
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+import requests
 
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
@@ -8,13 +14,54 @@ from selenium.webdriver.support import expected_conditions as EC
 
 from main.helpers import filename_helper
 from main.helpers.s3 import s3_helper
+from main.leases import LeaseLost
+from main.utils import setup_chrome_driver
+from context import SCRAPE_UPLOAD_WORKERS, S3_AUDIO_PATH, DEFAULT_FEED_ID
 
 # Configuration
 COOKIES_FILE = "../cookies.pkl"
 LOGIN_URL = "https://www.broadcastify.com/login/"
 TARGET_URL = "https://www.broadcastify.com/calls/tg/6957/1311"
+USER_AGENT = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) "
+              "Chrome/114.0.5735.90 Safari/537.36")
+
+# Drivers that already have the saved session, so warm pooled drivers skip loading it again.
+# Cookie presence is no signal: the site sets its own cookies on a cold browser's first page load.
+_session_drivers = weakref.WeakSet()
+
+
+class CallsTableParser(HTMLParser):
+    """
+    Collects the hrefs of the .mp3 links inside the element with id="callsTable".
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.found_table = False
+        self.mp3_hrefs = []
+        self._table_tag = None
+        self._depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if self._depth == 0:
+            if attrs.get("id") == "callsTable":
+                self.found_table = True
+                self._table_tag = tag
+                self._depth = 1
+            return
+
+        if tag == self._table_tag:
+            self._depth += 1
+        elif tag == "a" and (attrs.get("href") or "").endswith(".mp3"):
+            self.mp3_hrefs.append(attrs["href"])
+
+    def handle_endtag(self, tag):
+        if self._depth and tag == self._table_tag:
+            self._depth -= 1
 
-def login(driver, email, password):
+
+def login(driver, email, password, cookies_file=COOKIES_FILE):
 
     driver.get(LOGIN_URL)
 
@@ -35,35 +82,179 @@ def login(driver, email, password):
     print("Login successful.")
 
     # Save cookies to a file
-    with open(COOKIES_FILE, "wb") as f:
+    with open(cookies_file, "wb") as f:
         pickle.dump(driver.get_cookies(), f)
+    _session_drivers.add(driver)
 
 
-def upload_chunked_audio_s3(mp3_urls, db):
+def parse_calls_table(html, base_url):
+    """
+    Extracts the MP3 urls from the calls table of a Broadcastify calls page.
+
+    :param html: The page HTML.
+    :param base_url: The url the page was served from, used to resolve relative links.
+    :return: A list of absolute MP3 urls, or None if the page has no calls table (e.g. the login page).
+    """
+    parser = CallsTableParser()
+    parser.feed(html)
+    parser.close()
+    if not parser.found_table:
+        return None
+    return [urljoin(base_url, href) for href in parser.mp3_hrefs]
+
+
+def load_cookie_session(cookies_file=COOKIES_FILE):
+    """
+    Creates a requests session carrying the cookies saved by the last Selenium login.
+    """
+    session = requests.Session()
+    session.headers["User-Agent"] = USER_AGENT
+    if os.path.exists(cookies_file):
+        with open(cookies_file, "rb") as f:
+            cookies = pickle.load(f)
+            for cookie in cookies:
+                session.cookies.set(
+                    cookie["name"],
+                    cookie["value"],
+                    domain=cookie.get("domain"),
+                    path=cookie.get("path", "/")
+                )
+    return session
 
-    for url in mp3_urls:
 
+def fetch_mp3_urls(session, target_url=TARGET_URL):
+    """
+    Fetches the calls page over plain HTTP and returns its MP3 urls.
+
+    :return: A list of MP3 urls, or None if the session was rejected.
+    """
+    response = session.get(target_url, timeout=30)
+    if response.status_code in (401, 403):
+        return None
+    response.raise_for_status()
+    return parse_calls_table(response.text, response.url)
+
+
+def measure_overlap(mp3_urls, last_uploaded_filename):
+    """
+    Compares a scraped calls table with the last_uploaded watermark.
+
+    Returns:
+        dict: listed - calls on the page, new - calls newer than the watermark,
+              overlap - whether the page still shows a call at or before the watermark (None on the
+              first scrape, when there is no watermark), gap_seconds - seconds between the watermark
+              and the oldest listed call when there is no overlap.
+    """
+    timestamps = [
+        filename_helper.extract_timestamp_from_filename(os.path.basename(url)) for url in mp3_urls
+    ]
+    timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
+
+    last_uploaded_timestamp = 0
+    if last_uploaded_filename:
+        last_uploaded_timestamp = filename_helper.extract_timestamp_from_filename(last_uploaded_filename) or 0
+
+    new = sum(1 for timestamp in timestamps if timestamp > last_uploaded_timestamp)
+    overlap = None
+    gap_seconds = 0
+    if last_uploaded_timestamp and timestamps:
+        overlap = min(timestamps) <= last_uploaded_timestamp
+        if not overlap:
+            gap_seconds = min(timestamps) - last_uploaded_timestamp
+
+    return {"listed": len(timestamps), "new": new, "overlap": overlap, "gap_seconds": gap_seconds}
+
+
+def select_new_chunks(mp3_urls, last_uploaded_filename):
+    """
+    Returns the urls newer than the last_uploaded watermark, sorted by timestamp.
+    """
+    if not last_uploaded_filename:
+        # No previously uploaded file - maybe just proceed or set a baseline.
+        last_uploaded_timestamp = 0
+    else:
+        last_uploaded_timestamp = filename_helper.extract_timestamp_from_filename(last_uploaded_filename)
+
+    pending = []
+    for url in mp3_urls:
         curr_filename = os.path.basename(url)
         curr_filename_timestamp = filename_helper.extract_timestamp_from_filename(curr_filename)
 
-        last_uploaded_filename = db.get_last_uploaded_filename()
-        if not last_uploaded_filename:
-            # No previously uploaded file - maybe just proceed or set a baseline.
-            last_uploaded_timestamp = 0
-        else:
-            last_uploaded_timestamp = filename_helper.extract_timestamp_from_filename(last_uploaded_filename)
-
         # If the current file's timestamp is older or equal to the last uploaded timestamp, skip it
         if curr_filename_timestamp <= last_uploaded_timestamp:
             print(f"Already uploaded {curr_filename}")
-            continue
         else:
-            # upload new audio to s3
-            if s3_helper.upload_mp3_to_s3(url):
-                # increment db counter
-                db.increment_counter()
-                # save new latest filename
-                db.set_last_uploaded_filename(curr_filename)
+            pending.append(url)
+
+    return sort_audio(pending)
+
+
+def upload_new_chunks(pending, executor, session, s3, prefix=S3_AUDIO_PATH, cache=None):
+    """
+    Uploads the pending urls concurrently on the given executor, sharing one HTTP session and
+    one S3 client.
+
+    Uploads run concurrently, but results are consumed in timestamp order and only an unbroken
+    run of successes is returned. If a chunk fails, everything after it is left for the next
+    scrape, so advancing the watermark over the result never skips a call.
+
+    :return: The uploaded chunks in timestamp order, as returned by s3_helper.upload_mp3_to_s3.
+    """
+    futures = [executor.submit(s3_helper.upload_mp3_to_s3, url, session, s3, prefix, cache) for url in pending]
+
+    uploaded = []
+    for url, future in zip(pending, futures):
+        curr_filename = os.path.basename(url)
+        try:
+            chunk = future.result()
+        except Exception as e:
+            print(f"Failed to upload {curr_filename}: {e}")
+            chunk = None
+
+        if not chunk:
+            # Stop advancing the watermark, the rest will be retried on the next scrape
+            print(f"Stopping at {curr_filename}, later chunks will be retried.")
+            for remaining in futures:
+                remaining.cancel()
+            break
+
+        uploaded.append(chunk)
+    return uploaded
+
+
+def upload_chunked_audio_s3(mp3_urls, db, max_workers=SCRAPE_UPLOAD_WORKERS, feed=None, cache=None, lease=None):
+    """
+    Uploads every new chunk in mp3_urls to S3 using a bounded pool of workers that share one
+    HTTP session and one S3 client. The watermark is read once and the whole run is recorded
+    in a single transaction.
+
+    :param feed: The Feed the urls were scraped from, the default feed if omitted.
+    :param cache: Optional ChunkCache the uploaded chunks are also written to.
+    :param lease: The feed's scrape lease, if any. The chunks are not recorded once it is lost.
+    :return: The overlap stats of the scrape, see measure_overlap, or None if lease was lost.
+    """
+    feed_id = feed.feed_id if feed else DEFAULT_FEED_ID
+    prefix = feed.audio_prefix if feed else S3_AUDIO_PATH
+
+    last_uploaded_filename = db.get_last_uploaded_filename(feed_id)
+    stats = measure_overlap(mp3_urls, last_uploaded_filename)
+    pending = select_new_chunks(mp3_urls, last_uploaded_filename)
+    if not pending:
+        return stats
+
+    session = s3_helper.create_http_session(max_workers)
+    s3 = s3_helper.create_s3_client(max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        uploaded = upload_new_chunks(pending, executor, session, s3, prefix, cache)
+    session.close()
+
+    # record the chunks, counter and new latest filename in one transaction
+    try:
+        db.record_uploaded_chunks(uploaded, feed_id, lease=lease)
+    except LeaseLost as e:
+        print(f"Not recording the scrape of {feed or feed_id}: {e}")
+        return None
+    return stats
 
 
 def extract_id_from_filename(filename):
@@ -84,37 +275,58 @@ def sort_audio(mp3_urls):
     sorted_urls = sorted(mp3_urls, key=lambda url: int(os.path.basename(url).split('-')[0]))
     return sorted_urls  # No need to reverse, as this is in ascending order
 
-def run_broadcastify_job(driver, db, email, password):
-    try:
-        # Step 1: Load cookies and navigate to the target URL
-        driver.get(TARGET_URL)
+def run_broadcastify_job(driver, db, email, password, feed=None, cache=None, lease=None):
+    """
+    Scrapes the calls table with Selenium. The caller owns the driver, so a warm driver
+    from a DriverPool can be reused across runs. lease is the feed's scrape lease, if any,
+    see upload_chunked_audio_s3.
+    """
+    target_url = feed.url if feed else TARGET_URL
+
+    # Step 1: Navigate to the target URL, loading cookies if the browser is cold
+    driver.get(target_url)
+    if driver not in _session_drivers:
         load_cookies(driver)
         driver.refresh()  # Refresh to apply cookies
+        _session_drivers.add(driver)
 
-        # Step 2: Check if logged in
-        try:
-            WebDriverWait(driver, 5).until(
-                EC.presence_of_element_located((By.ID, "callsTable"))
-            )
-        except:
-            login(driver, email, password)
-            driver.get(TARGET_URL)
-
-        # Step 3: Wait for the table to load
-        WebDriverWait(driver, 10).until(EC.visibility_of_element_located((By.ID, "callsTable")))
-        print("Target page loaded." + driver.current_url)
-
-        # Step 4: Find MP3 links
-        calls_table = driver.find_element(By.ID, "callsTable")
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_all_elements_located((By.CSS_SELECTOR, "#callsTable a[href$='.mp3']")))
-        mp3_links = calls_table.find_elements(By.CSS_SELECTOR, "a[href$='.mp3']")
-        mp3_urls = [link.get_attribute("href") for link in mp3_links]
-        sorted_urls = sort_audio(mp3_urls)
-
-        # Step 5: Upload Audio to S3
-        upload_chunked_audio_s3(sorted_urls, db)
-        driver.quit()
+    # Step 2: Check if logged in
+    try:
+        WebDriverWait(driver, 5).until(
+            EC.presence_of_element_located((By.ID, "callsTable"))
+        )
+    except:
+        login(driver, email, password)
+        driver.get(target_url)
+
+    # Step 3: Wait for the table to load
+    WebDriverWait(driver, 10).until(EC.visibility_of_element_located((By.ID, "callsTable")))
+    print("Target page loaded." + driver.current_url)
 
+    # Step 4: Find MP3 links
+    calls_table = driver.find_element(By.ID, "callsTable")
+    WebDriverWait(driver, 10).until(
+        EC.presence_of_all_elements_located((By.CSS_SELECTOR, "#callsTable a[href$='.mp3']")))
+    mp3_links = calls_table.find_elements(By.CSS_SELECTOR, "a[href$='.mp3']")
+    mp3_urls = [link.get_attribute("href") for link in mp3_links]
+    sorted_urls = sort_audio(mp3_urls)
+
+    # Step 5: Upload Audio to S3
+    return upload_chunked_audio_s3(sorted_urls, db, feed=feed, cache=cache, lease=lease)
+
+
+def relogin(email, password, cookies_file=COOKIES_FILE, driver_pool=None):
+    """
+    Logs in with Selenium to refresh the saved session cookies.
+    """
+    if driver_pool is not None:
+        with driver_pool.acquire() as driver:
+            login(driver, email, password, cookies_file)
+        return
+
+    driver = setup_chrome_driver()
+    try:
+        login(driver, email, password, cookies_file)
     finally:
         driver.quit()
+
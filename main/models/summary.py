@@ -4,7 +4,19 @@ from sqlite3 import Connection
 from typing import List, Optional
 
 
+# created_date is kept from the first save
+UPSERT_SQL = """
+    INSERT INTO summary (id, data, transcription_file_ids, created_date)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET
+        data = excluded.data,
+        transcription_file_ids = excluded.transcription_file_ids
+"""
+
+
 class Summary:
+    __slots__ = ("id", "text", "transcription_file_ids", "created_date")
+
     def __init__(
             self,
             text: dict,
@@ -32,31 +44,32 @@ class Summary:
         db.conn.execute(create_table_sql)
         db.conn.commit()
 
-    def save(self, db):
+    def _row(self) -> tuple:
+        return (self.id, json.dumps(self.text), json.dumps(self.transcription_file_ids), self.created_date)
 
-        if self.id is not None:
-            # Update existing record
-            update_sql = """
-                UPDATE summary
-                SET data = ?, transcription_file_ids = ?
-                WHERE id = ?
-                """
-            db.conn.execute(
-                update_sql,
-                (json.dumps(self.text), json.dumps(self.transcription_file_ids), self.id)
-            )
-        else:
-            # Insert new record (set created_date)
-            insert_sql = """
-                            INSERT INTO summary (data, transcription_file_ids, created_date)
-                            VALUES (?, ?, ?)
-                            """
-            cursor = db.conn.execute(
-                insert_sql,
-                (json.dumps(self.text), json.dumps(self.transcription_file_ids), self.created_date)
-            )
+    def save(self, db):
+        """
+        Saves the summary, updating the record if it already has an id. New summaries get their id
+        assigned from the database.
+        """
+        with db.transaction() as conn:
+            cursor = conn.execute(UPSERT_SQL, self._row())
+        if self.id is None:
             self.id = cursor.lastrowid
-        db.conn.commit()
+
+    @classmethod
+    def save_many(cls, db, summaries: List['Summary']) -> int:
+        """
+        Upserts a batch of summaries in a single transaction and assigns the ids of new ones.
+
+        :return: The number of summaries saved.
+        """
+        with db.transaction() as conn:
+            for summary in summaries:
+                cursor = conn.execute(UPSERT_SQL, summary._row())
+                if summary.id is None:
+                    summary.id = cursor.lastrowid
+        return len(summaries)
 
     def set_text(self, text: dict):
         """
@@ -84,18 +97,40 @@ class Summary:
             raise ValueError("transcription_file_ids must be a list")
         self.transcription_file_ids = ids
 
+    @classmethod
+    def from_row(cls, row) -> 'Summary':
+        return cls(
+            text=json.loads(row["data"]),
+            transcription_file_ids=json.loads(row["transcription_file_ids"]),
+            created_date=row["created_date"],
+            id=row["id"]
+        )
+
     @classmethod
     def load(cls, db, id_val: int):
         """
         Load a Summary object by ID from the database.
         """
-        select_sql = "SELECT id, data, transcription_file_ids FROM summary WHERE id = ?"
+        select_sql = "SELECT id, data, transcription_file_ids, created_date FROM summary WHERE id = ?"
         cursor = db.conn.execute(select_sql, (id_val,))
         row = cursor.fetchone()
         if row:
-            return cls(
-                text=json.loads(row["data"]),
-                transcription_file_ids=json.loads(row["transcription_file_ids"]),
-                created_date=row["created_date"]
-            )
+            return cls.from_row(row)
         return None
+
+    @classmethod
+    def get_between(cls, db, start, end) -> List['Summary']:
+        """
+        Returns the summaries created in [start, end), oldest first, through the created_date index.
+
+        :param start: A datetime or ISO 8601 string.
+        :param end: A datetime or ISO 8601 string.
+        """
+        start = start.isoformat() if isinstance(start, datetime) else start
+        end = end.isoformat() if isinstance(end, datetime) else end
+        cursor = db.conn.execute(
+            "SELECT id, data, transcription_file_ids, created_date FROM summary "
+            "WHERE created_date >= ? AND created_date < ? ORDER BY created_date",
+            (start, end)
+        )
+        return [cls.from_row(row) for row in cursor.fetchall()]
@@ -1,35 +1,121 @@
 import json
 import sqlite3
-from typing import Optional, List, Dict, Any
+import zlib
+from typing import Optional, List, Dict, Any, Iterator, Union
+
+
+def encode_data(data: Dict[str, Any]) -> bytes:
+    """
+    Serializes the raw Transcribe JSON to the zlib-compressed BLOB stored in the data column.
+    """
+    return zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_data(stored: Union[bytes, str, None]) -> Dict[str, Any]:
+    """
+    Decodes the data column, either a compressed BLOB or a JSON TEXT row written before compression.
+    """
+    if not stored:
+        return {}
+    if isinstance(stored, bytes):
+        stored = zlib.decompress(stored).decode("utf-8")
+    return json.loads(stored)
+
+
+COLUMNS = ("file_id", "data", "transcription", "summarized", "audio_url", "transcribe_url", "summary_id",
+           "archive_key")
+
+UPSERT_SQL = """
+    INSERT INTO transcription (file_id, data, transcription, summarized, audio_url, transcribe_url, summary_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (file_id) DO UPDATE SET
+        data = excluded.data,
+        transcription = excluded.transcription,
+        summarized = excluded.summarized,
+        audio_url = excluded.audio_url,
+        transcribe_url = excluded.transcribe_url,
+        summary_id = excluded.summary_id
+"""
 
 
 class Transcription:
+    __slots__ = ("file_id", "_data", "_stored_data", "transcription", "summarized", "audio_url",
+                 "transcribe_url", "summary_id", "archive_key")
+
     def __init__(
         self,
         file_id: int,
-        data: Dict[str, Any],
+        data: Optional[Dict[str, Any]],
         transcription: str,
         summarized: bool,
         audio_url: str,
         transcribe_url: str,
         summary_id: Optional[int] = None,
+        stored_data: Union[bytes, str, None] = None,
+        archive_key: Optional[str] = None,
     ):
-        if not isinstance(data, dict):
+        """
+        data is the raw Transcribe JSON. Rows loaded from the database pass data=None and the
+        stored column value as stored_data instead, which is only decoded when .data is first read.
+        Rows whose data was archived have an empty stored_data and the archive_key of the archive
+        file, which .data reads through instead.
+        """
+        if data is not None and not isinstance(data, dict):
             raise ValueError("data must be a dictionary")
         self.file_id = file_id
-        self.data = data
+        self._data = data
+        self._stored_data = stored_data
         self.transcription = transcription
         self.summarized = summarized
         self.audio_url = audio_url
         self.transcribe_url = transcribe_url
         self.summary_id = summary_id
+        self.archive_key = archive_key
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        if self._data is None:
+            if not self._stored_data and self.archive_key:
+                from main.archive import load_archived_data
+                self._data = load_archived_data(self.archive_key, self.file_id)
+            else:
+                self._data = decode_data(self._stored_data)
+            self._stored_data = None
+        return self._data
+
+    @data.setter
+    def data(self, data: Dict[str, Any]):
+        if not isinstance(data, dict):
+            raise ValueError("data must be a dictionary")
+        self._data = data
+        self._stored_data = None
+
+    def _encoded_data(self) -> bytes:
+        # Reuse the stored blob if the data was never decoded
+        if self._data is None and isinstance(self._stored_data, bytes):
+            return self._stored_data
+        return encode_data(self.data)
+
+    @classmethod
+    def from_row(cls, row) -> 'Transcription':
+        return cls(
+            file_id=row["file_id"],
+            data=None,
+            transcription=row["transcription"],
+            summarized=bool(row["summarized"]),
+            audio_url=row["audio_url"],
+            transcribe_url=row["transcribe_url"],
+            summary_id=row["summary_id"] if row["summary_id"] is not None else None,
+            stored_data=row["data"],
+            archive_key=row["archive_key"]
+        )
 
     @classmethod
     def create_table(cls, db):
         create_table_sql = """
             CREATE TABLE IF NOT EXISTS transcription (
                 file_id INTEGER PRIMARY KEY,
-                data TEXT NOT NULL,
+                data BLOB NOT NULL,
                 transcription TEXT NOT NULL,
                 summarized INTEGER NOT NULL,
                 audio_url TEXT NOT NULL,
@@ -39,12 +125,33 @@ class Transcription:
             );
         """
         db.conn.execute(create_table_sql)
+        # Set on rows whose data was moved out to an archive file by main.archive
+        db.add_column_if_missing("transcription", "archive_key", "TEXT")
 
         # Create an index on the summarized field for faster lookups
         db.conn.execute("CREATE INDEX IF NOT EXISTS idx_transcription_summarized ON transcription (summarized);")
 
         db.conn.commit()
 
+    @classmethod
+    def compress_legacy_data(cls, db) -> int:
+        """
+        Rewrites rows whose data is still JSON TEXT as compressed BLOBs. Older rows stay readable
+        either way, this only reclaims the space.
+
+        :return: The number of rows compressed.
+        """
+        rows = db.conn.execute("SELECT file_id, data FROM transcription WHERE typeof(data) = 'text'").fetchall()
+        if not rows:
+            return 0
+        db.conn.executemany(
+            "UPDATE transcription SET data = ? WHERE file_id = ?",
+            [(encode_data(decode_data(row["data"])), row["file_id"]) for row in rows]
+        )
+        db.conn.commit()
+        print(f"Compressed the data of {len(rows)} transcriptions.")
+        return len(rows)
+
     @classmethod
     def get_by_file_id(cls, db, file_id: int) -> Optional['Transcription']:
         """
@@ -54,15 +161,7 @@ class Transcription:
             cursor = db.conn.execute("SELECT * FROM transcription WHERE file_id = ?", (file_id,))
             row = cursor.fetchone()
             if row:
-                return cls(
-                    file_id=row["file_id"],
-                    data=json.loads(row["data"]),
-                    transcription=row["transcription"],
-                    summarized=bool(row["summarized"]),
-                    audio_url=row["audio_url"],
-                    transcribe_url=row["transcribe_url"],
-                    summary_id=row["summary_id"] if row["summary_id"] is not None else None
-                )
+                return cls.from_row(row)
         except Exception as e:
             print(f"Error retrieving transcription: {e}")
         return None
@@ -74,83 +173,107 @@ class Transcription:
         """
         val = 1 if summarized else 0
         cursor = db.conn.execute(
-            "SELECT * FROM transcription WHERE summarized = ?",
+            "SELECT * FROM transcription WHERE summarized = ? ORDER BY file_id",
             (val,)
         )
         rows = cursor.fetchall()
-        return [
-            cls(
-                file_id=row["file_id"],
-                data=json.loads(row["data"]) if row["data"] else {},
-                transcription=row["transcription"],
-                summarized=bool(row["summarized"]),
-                audio_url=row["audio_url"],
-                transcribe_url=row["transcribe_url"],
-                summary_id=row["summary_id"] if row["summary_id"] is not None else None
-            )
-            for row in rows
-        ]
+        return [cls.from_row(row) for row in rows]
+
+    @classmethod
+    def get_by_summary_id(cls, db, summary_id: int) -> List['Transcription']:
+        """
+        Retrieves the transcriptions behind a summary in file_id order, through the summary_id index.
+        """
+        cursor = db.conn.execute(
+            "SELECT * FROM transcription WHERE summary_id = ? ORDER BY file_id",
+            (summary_id,)
+        )
+        return [cls.from_row(row) for row in cursor.fetchall()]
+
+    @classmethod
+    def iter_by_summarized(cls, db, summarized: bool, columns=("file_id", "transcription"),
+                           batch_size: int = 500) -> Iterator[sqlite3.Row]:
+        """
+        Streams the transcriptions with the given summarized flag in file_id order, selecting only
+        the requested columns. Rows are fetched batch_size at a time, so memory stays flat however
+        many transcriptions match. The summarized index already keeps each flag's rows in file_id
+        order, so the database does not sort.
+
+        :return: An iterator of sqlite3.Row with the requested columns.
+        """
+        unknown = set(columns) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown transcription columns: {sorted(unknown)}")
+        cursor = db.conn.execute(
+            f"SELECT {', '.join(columns)} FROM transcription WHERE summarized = ? ORDER BY file_id",
+            (1 if summarized else 0,)
+        )
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cursor.close()
 
     @classmethod
     def update_summarized(cls, db, file_id: int, summarized: bool) -> bool:
         val = 1 if summarized else 0
-        db.conn.execute(
+        cursor = db.conn.execute(
             "UPDATE transcription SET summarized = ? WHERE file_id = ?",
             (val, file_id)
         )
         db.conn.commit()
-        return db.conn.total_changes > 0
+        return cursor.rowcount > 0
+
+    @classmethod
+    def mark_summarized(cls, db, file_ids: List[int], summary_id: int) -> int:
+        """
+        Marks the given transcriptions as summarized by summary_id in a single transaction.
+
+        :return: The number of transcriptions updated.
+        """
+        if not file_ids:
+            return 0
+        with db.transaction() as conn:
+            cursor = conn.executemany(
+                "UPDATE transcription SET summarized = 1, summary_id = ? WHERE file_id = ?",
+                [(summary_id, file_id) for file_id in file_ids]
+            )
+        return cursor.rowcount
+
+    @classmethod
+    def save_many(cls, db, transcriptions: List['Transcription']) -> int:
+        """
+        Upserts a batch of transcriptions in a single transaction.
+
+        :return: The number of transcriptions saved.
+        """
+        if not transcriptions:
+            return 0
+        with db.transaction() as conn:
+            conn.executemany(UPSERT_SQL, [t._row() for t in transcriptions])
+        return len(transcriptions)
+
+    def _row(self) -> tuple:
+        return (
+            self.file_id,
+            self._encoded_data(),
+            self.transcription,
+            1 if self.summarized else 0,
+            self.audio_url,
+            self.transcribe_url,
+            self.summary_id
+        )
 
     def save(self, db):
         """
-        Saves the transcription to the database.
-        If the transcription exists (based on file_id), it updates the record.
-        Otherwise, it inserts a new record.
+        Saves the transcription to the database, updating the record if the file_id already exists.
         """
         try:
-            # Check if the transcription already exists
-            cursor = db.conn.execute("SELECT 1 FROM transcription WHERE file_id = ?", (self.file_id,))
-            exists = cursor.fetchone() is not None
-
-            if exists:
-                # Update existing record
-                update_sql = """
-                    UPDATE transcription
-                    SET data = ?, transcription = ?, summarized = ?, audio_url = ?, transcribe_url = ?, summary_id = ?
-                    WHERE file_id = ?
-                """
-                db.conn.execute(
-                    update_sql,
-                    (
-                        json.dumps(self.data),
-                        self.transcription,
-                        1 if self.summarized else 0,
-                        self.audio_url,
-                        self.transcribe_url,
-                        self.summary_id,
-                        self.file_id
-                    )
-                )
-            else:
-                # Insert new record
-                insert_sql = """
-                    INSERT INTO transcription (file_id, data, transcription, summarized, audio_url, transcribe_url, summary_id)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """
-                db.conn.execute(
-                    insert_sql,
-                    (
-                        self.file_id,
-                        json.dumps(self.data),
-                        self.transcription,
-                        1 if self.summarized else 0,
-                        self.audio_url,
-                        self.transcribe_url,
-                        self.summary_id
-                    )
-                )
-            db.conn.commit()
-
+            with db.transaction() as conn:
+                conn.execute(UPSERT_SQL, self._row())
         except sqlite3.IntegrityError as ie:
             print(f"Integrity Error saving transcription: {ie}")
         except Exception as e:
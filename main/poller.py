@@ -0,0 +1,106 @@
+import time
+
+from context import POLL_INITIAL_SECONDS, POLL_MIN_SECONDS, POLL_MAX_SECONDS
+
+
+class AdaptivePoller:
+    """
+    Decides how long to wait between scrapes from what each scrape observed.
+
+    - If a feed returned new calls but none of the calls it had already uploaded, the calls table
+      scrolled past the watermark between ticks and calls were probably missed, so the interval shrinks.
+    - If no feed returned new calls, the interval grows.
+    - Otherwise the interval moves towards the time it takes the observed arrival rate to fill
+      half of the calls table, so the next scrape still overlaps the watermark.
+    """
+
+    def __init__(self, initial_seconds=POLL_INITIAL_SECONDS, min_seconds=POLL_MIN_SECONDS,
+                 max_seconds=POLL_MAX_SECONDS, shrink_factor=0.5, grow_factor=1.5, table_fill_target=0.5):
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.shrink_factor = shrink_factor
+        self.grow_factor = grow_factor
+        self.table_fill_target = table_fill_target
+        self.interval_seconds = self._clamp(initial_seconds)
+        self.next_run_at = time.monotonic()
+        self.last_observed_at = None
+
+        self.scrapes = 0
+        self.empty_scrapes = 0
+        self.overlapping_scrapes = 0
+        self.missed_scrapes = 0
+        self.last_gap_seconds = 0
+        self.max_gap_seconds = 0
+        self.total_gap_seconds = 0
+        self.arrival_rate_per_minute = None
+
+    def is_due(self, now=None):
+        now = time.monotonic() if now is None else now
+        return now >= self.next_run_at
+
+    def observe(self, feed_stats, now=None):
+        """
+        Updates the interval from one scrape and schedules the next one.
+
+        :param feed_stats: One dict per scraped feed, as returned by login_and_scrape.measure_overlap.
+        """
+        now = time.monotonic() if now is None else now
+        elapsed = now - self.last_observed_at if self.last_observed_at is not None else None
+        self.last_observed_at = now
+        self.scrapes += 1
+
+        new_calls = sum(stats["new"] for stats in feed_stats)
+        missed = [stats for stats in feed_stats if stats["new"] and stats["overlap"] is False]
+        gap_seconds = max((stats["gap_seconds"] for stats in missed), default=0)
+
+        if elapsed:
+            self.arrival_rate_per_minute = new_calls / elapsed * 60
+
+        if missed:
+            self.missed_scrapes += 1
+            self.last_gap_seconds = gap_seconds
+            self.max_gap_seconds = max(self.max_gap_seconds, gap_seconds)
+            self.total_gap_seconds += gap_seconds
+            self.interval_seconds = self._clamp(self.interval_seconds * self.shrink_factor)
+        elif new_calls == 0:
+            self.empty_scrapes += 1
+            self.interval_seconds = self._clamp(self.interval_seconds * self.grow_factor)
+        else:
+            self.overlapping_scrapes += 1
+            target = self._rate_based_interval(feed_stats, elapsed)
+            if target is not None:
+                # Move halfway to the target so one noisy tick cannot swing the interval
+                self.interval_seconds = self._clamp((self.interval_seconds + target) / 2)
+
+        self.next_run_at = now + self.interval_seconds
+        print(f"Next scrape in {self.interval_seconds:.0f}s "
+              f"({new_calls} new calls, {len(missed)} feeds without overlap)")
+        return self.interval_seconds
+
+    def stats(self):
+        return {
+            "interval_seconds": self.interval_seconds,
+            "scrapes": self.scrapes,
+            "empty_scrapes": self.empty_scrapes,
+            "overlapping_scrapes": self.overlapping_scrapes,
+            "missed_scrapes": self.missed_scrapes,
+            "last_gap_seconds": self.last_gap_seconds,
+            "max_gap_seconds": self.max_gap_seconds,
+            "total_gap_seconds": self.total_gap_seconds,
+            "arrival_rate_per_minute": self.arrival_rate_per_minute,
+        }
+
+    def _rate_based_interval(self, feed_stats, elapsed):
+        if not elapsed:
+            return None
+
+        # The busiest feed decides: its table must not scroll past the watermark
+        intervals = []
+        for stats in feed_stats:
+            if stats["new"] and stats["listed"]:
+                seconds_per_call = elapsed / stats["new"]
+                intervals.append(stats["listed"] * self.table_fill_target * seconds_per_call)
+        return min(intervals) if intervals else None
+
+    def _clamp(self, seconds):
+        return max(self.min_seconds, min(self.max_seconds, seconds))
@@ -0,0 +1,140 @@
+import tempfile
+from bisect import bisect_right
+
+import numpy as np
+from pydub import AudioSegment
+
+from context import (SILENCE_THRESHOLD_DBFS, SILENCE_MIN_SECONDS, SILENCE_PADDING_SECONDS,
+                     SILENCE_FRAME_MS, SILENCE_VAD_AGGRESSIVENESS)
+
+try:
+    import webrtcvad
+except ImportError:  # optional, energy detection is used on its own without it
+    webrtcvad = None
+
+VAD_FRAME_RATE = 16000
+
+
+def frame_energy_dbfs(samples, frame_length):
+    """
+    Returns the RMS level of each frame_length window of int16 samples, in dBFS.
+    """
+    frame_count = len(samples) // frame_length
+    if frame_count == 0:
+        return np.empty(0, dtype=np.float32)
+    frames = samples[:frame_count * frame_length].astype(np.float32).reshape(frame_count, frame_length)
+    rms = np.sqrt(np.mean(np.square(frames), axis=1))
+    return 20 * np.log10(np.maximum(rms, 1.0) / 32768.0)
+
+
+def vad_speech_frames(segment, frame_ms, frame_count):
+    """
+    Runs WebRTC VAD over the audio, returning a boolean per frame, or None if webrtcvad is not installed.
+    """
+    if webrtcvad is None:
+        return None
+    vad = webrtcvad.Vad(SILENCE_VAD_AGGRESSIVENESS)
+    pcm = segment.set_frame_rate(VAD_FRAME_RATE).set_channels(1).set_sample_width(2).raw_data
+    frame_bytes = VAD_FRAME_RATE * frame_ms // 1000 * 2
+    speech = np.zeros(frame_count, dtype=bool)
+    for i in range(min(frame_count, len(pcm) // frame_bytes)):
+        speech[i] = vad.is_speech(pcm[i * frame_bytes:(i + 1) * frame_bytes], VAD_FRAME_RATE)
+    return speech
+
+
+def detect_speech_regions(voiced, frame_ms, min_silence_seconds=SILENCE_MIN_SECONDS,
+                          padding_seconds=SILENCE_PADDING_SECONDS):
+    """
+    Turns per-frame voiced flags into (start_ms, end_ms) regions to keep. Silences shorter than
+    min_silence_seconds are kept so normal pauses survive, and every region is padded so words
+    are not clipped.
+    """
+    if not voiced.any():
+        return []
+
+    # Find the edges of each voiced run
+    padded = np.concatenate(([False], voiced, [False]))
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+
+    min_gap_frames = int(min_silence_seconds * 1000 / frame_ms)
+    pad_frames = int(padding_seconds * 1000 / frame_ms)
+    total_frames = len(voiced)
+
+    regions = []
+    for start, end in zip(starts, ends):
+        start, end = max(0, start - pad_frames), min(total_frames, end + pad_frames)
+        if regions and start - regions[-1][1] < min_gap_frames:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+    return [(int(start) * frame_ms, int(end) * frame_ms) for start, end in regions]
+
+
+def trim_silence(audio_file, threshold_dbfs=SILENCE_THRESHOLD_DBFS, frame_ms=SILENCE_FRAME_MS):
+    """
+    Removes squelch tails and dead air from an MP3. A frame is kept when its energy is above
+    threshold_dbfs and, if webrtcvad is installed, the VAD also hears speech in it.
+
+    :param audio_file: A file-like object holding the glued MP3.
+    :return: (trimmed MP3 temporary file, offset map, seconds trimmed). The offset map is a list of
+             [trimmed_start, original_start, duration] in seconds, see map_to_original.
+    """
+    segment = AudioSegment.from_file(audio_file, format="mp3")
+    original_seconds = len(segment) / 1000
+
+    mono = segment.set_channels(1).set_sample_width(2)
+    samples = np.frombuffer(mono.raw_data, dtype=np.int16)
+    frame_length = mono.frame_rate * frame_ms // 1000
+
+    voiced = frame_energy_dbfs(samples, frame_length) > threshold_dbfs
+    speech = vad_speech_frames(mono, frame_ms, len(voiced))
+    if speech is not None:
+        voiced &= speech
+
+    regions = detect_speech_regions(voiced, frame_ms)
+    if not regions:
+        print("No speech detected, leaving the audio untrimmed.")
+        audio_file.seek(0)
+        return audio_file, [], 0.0
+
+    offset_map = []
+    trimmed_ms = 0
+    for start_ms, end_ms in regions:
+        offset_map.append([trimmed_ms / 1000, start_ms / 1000, (end_ms - start_ms) / 1000])
+        trimmed_ms += end_ms - start_ms
+
+    kept = segment._spawn(b"".join(segment[start_ms:end_ms].raw_data for start_ms, end_ms in regions))
+    output = tempfile.TemporaryFile()
+    kept.export(output, format="mp3")
+    output.seek(0)
+
+    trimmed_seconds = original_seconds - trimmed_ms / 1000
+    print(f"Trimmed {trimmed_seconds:.1f}s of silence from {original_seconds:.1f}s of audio "
+          f"({trimmed_seconds / original_seconds * 100 if original_seconds else 0:.0f}%).")
+    return output, offset_map, trimmed_seconds
+
+
+def map_to_original(seconds, offset_map):
+    """
+    Maps a time in the trimmed audio back to the original audio.
+    """
+    if not offset_map:
+        return seconds
+    starts = [entry[0] for entry in offset_map]
+    index = max(0, bisect_right(starts, seconds) - 1)
+    trimmed_start, original_start, duration = offset_map[index]
+    return original_start + min(seconds - trimmed_start, duration)
+
+
+def remap_transcript_times(transcription_data, offset_map):
+    """
+    Rewrites the start_time/end_time of every item in a Transcribe result so they point into the
+    original, untrimmed audio. The offset map is kept in the data under "offset_map".
+    """
+    for item in transcription_data.get("results", {}).get("items", []):
+        for field in ("start_time", "end_time"):
+            if field in item:
+                item[field] = f"{map_to_original(float(item[field]), offset_map):.3f}"
+    transcription_data["offset_map"] = offset_map
+    return transcription_data
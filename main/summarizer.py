@@ -24,15 +24,17 @@ def upload_summarized_text(text, summary_id):
 
 def summarize(db):
 
-    # 1. Query all transcriptions with summarized = false
-    transcriptions = Transcription.get_all_by_summarized(db, False)
-
-    # 2. Sort transcriptions by their file_id
-    transcriptions.sort(key=lambda t: t.file_id)
-
-    # 3. Concatenate their transcription text into one large string
-    transcribed_text = " ".join([t.transcription for t in transcriptions])
-    print(f"Transcribed text: {transcribed_text}")
+    # 1. Stream the unsummarized transcriptions in file_id order, reading only the text
+    transcription_ids = []
+    parts = []
+    for row in Transcription.iter_by_summarized(db, False, columns=("file_id", "transcription")):
+        transcription_ids.append(row["file_id"])
+        parts.append(row["transcription"])
+
+    # 2. Concatenate their transcription text into one string
+    transcribed_text = " ".join(parts)
+    del parts
+    print(f"Transcribed text: {len(transcription_ids)} transcriptions, {len(transcribed_text)} characters")
     if not transcribed_text.strip():
         print("Error: No valid transcription text to summarize.")
         return {
@@ -40,10 +42,10 @@ def summarize(db):
             "message": "No valid transcription text to summarize."
         }
 
-    # 4. Upload full transcription text to s3
+    # 3. Upload full transcription text to s3
     upload_transcription_text(transcribed_text)
 
-    # 5. GPT the summary
+    # 4. GPT the summary
     gpt_result = call_gpt_and_check(transcribed_text)
     if gpt_result["status"] == "success":
         print("Successfully GPT'd daily summary!")
@@ -55,33 +57,29 @@ def summarize(db):
         }
     summarized_text = gpt_result["response"]
 
-    # 6. Create and save a Summary object
-    transcription_ids = [t.file_id for t in transcriptions]
+    # 5. Create and save a Summary object
     summary = Summary(
         text={"summary": summarized_text},
         transcription_file_ids=transcription_ids
     )
     summary.save(db)
 
-    # 7. Upload summary to s3
+    # 6. Upload summary to s3
     upload_summarized_text(summarized_text, summary.id)
 
-    # 8. Update each transcription to mark them as summarized
-    for t in transcriptions:
-        try:
-            t.summarized = True
-            t.summary_id = summary.id
-            t.save(db)
-        except Exception as e:
-            logging.error(f"Failed to save transcription {t.file_id}: {e}")
+    # 7. Mark the transcriptions as summarized in one transaction
+    try:
+        Transcription.mark_summarized(db, transcription_ids, summary.id)
+    except Exception as e:
+        logging.error(f"Failed to mark transcriptions {transcription_ids} as summarized: {e}")
 
-    # 9. Generate HTML File for Summary
+    # 8. Generate HTML File for Summary
     html_file = render_html(summarized_text)
 
-    # 10. Upload HTML file to s3
+    # 9. Upload HTML file to s3
     s3_helper.upload_html_to_s3(html_file)
 
-    # 11. Send to Mailchimp
+    # 10. Send to Mailchimp
     send_email_via_mailchimp(html_file)
 
     return summary
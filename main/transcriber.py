@@ -4,145 +4,333 @@ import time
 
 import boto3
 
-from context import S3_GLUED_AUDIO_PATH, S3_GLUED_ARCHIVED_AUDIO_PATH, S3_TRANSCRIPTION_PATH
+from context import (S3_CONTENT_HASH_METADATA, S3_GLUED_AUDIO_PATH, S3_GLUED_ARCHIVED_AUDIO_PATH, S3_TRANSCRIPTION_PATH, S3_GLUED_OFFSETS_PATH,
+                     TRANSCRIBE_POLL_INITIAL_SECONDS, TRANSCRIBE_POLL_MAX_SECONDS, TRANSCRIBE_LEASE_TTL_SECONDS)
 from config import AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, REGION_NAME, BUCKET_NAME
+from main.encode_profiles import MEDIA_FORMATS
+from main.leases import LeaseLost, LeaseManager
 from main.models.transcription import Transcription
+from main.transcription_backends import COMPLETED, FAILED, create_backend
+from main.silence import remap_transcript_times
 
-def transcribe(db):
+
+def load_offset_map(s3, file_id):
     """
-    1. List all audio.mp3 files in S3 under S3_GLUED_AUDIO_PATH.
-    2. Start a transcription job for each audio file found.
-    3. Poll for the job completion.
-    4. Once done, download the transcription JSON from S3, process it,
-       archive the original audio to S3_GLUED_ARCHIVED_AUDIO_PATH,
-       update the database record with the archived URL,
-       and store the new transcription record in the database.
+    Returns the silence trimming offset map uploaded by glue() for a glued file, or None if
+    the file was not trimmed.
     """
+    try:
+        obj = s3.get_object(Bucket=BUCKET_NAME, Key=f"{S3_GLUED_OFFSETS_PATH}{file_id}-glued.json")
+    except s3.exceptions.NoSuchKey:
+        return None
+    return json.loads(obj['Body'].read()).get("offset_map")
 
-    # Initialize S3 and Transcribe clients
-    s3 = boto3.client(
-        's3',
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-        region_name=REGION_NAME
-    )
-    transcribe_client = boto3.client(
-        'transcribe',
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-        region_name=REGION_NAME
-    )
-
-    # List all files in the audio directory
+
+def list_glued_files(s3):
+    """
+    Lists the glued audio files (.mp3, .flac, .ogg, see encode_profiles) waiting in S3 under S3_GLUED_AUDIO_PATH.
+    """
     response = s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=S3_GLUED_AUDIO_PATH)
     if 'Contents' not in response:
-        print("No audio files to transcribe, exiting.")
-        return
+        return []
 
-    # Filter files to only include .mp3 at the specified directory level
-    mp3_files = [
+    # Filter files to only include glued audio at the specified directory level
+    return [
         obj['Key'] for obj in response['Contents']
-        if obj['Key'].endswith('.mp3') and obj['Key'].count('/') == S3_GLUED_AUDIO_PATH.count('/')
+        if os.path.splitext(obj['Key'])[1] in MEDIA_FORMATS
+        and obj['Key'].count('/') == S3_GLUED_AUDIO_PATH.count('/')
+        and obj['Key'].endswith(f"-glued{os.path.splitext(obj['Key'])[1]}")
     ]
 
-    if not mp3_files:
-        print("No .mp3 files to glue.")
-        return
-    else:
-        print("Found .mp3 files:", mp3_files)
 
-    for item in mp3_files:
-        key = item
-        if key.endswith('-glued.mp3'):
-            # Extract file_id from filename (e.g. "1734140358-glued.mp3" -> 1734140358)
+class TranscriptionJob:
+    """
+    An outstanding transcription job and when it should be polled next. A job whose audio was
+    already transcribed has cached_output_key set and never reaches the backend.
+    """
+
+    def __init__(self, key, file_id, submitted_at, poll_seconds, content_hash=None):
+        self.key = key
+        self.file_id = file_id
+        self.filename = os.path.basename(key)
+        self.name = f"{file_id}-transcription-job"
+        self.output_key = f"{S3_TRANSCRIPTION_PATH}{file_id}-transcription.json"
+        self.submitted_at = submitted_at
+        self.poll_seconds = poll_seconds
+        self.next_poll_at = submitted_at + poll_seconds
+        self.content_hash = content_hash
+        self.cached_output_key = None
+        self.lease = None
+
+
+class TranscriptionJobManager:
+    """
+    Runs transcription jobs on a TranscriptionBackend (AWS Transcribe by default, see
+    transcription_backends) without blocking the caller.
+
+    submit() starts a job for every glued file at once and poll() checks every outstanding job
+    that is due in a single sweep, finalizing whichever have completed. Neither waits on a job:
+    each job is polled again after an exponentially growing delay (poll_initial_seconds doubling
+    up to poll_max_seconds), so the scheduler gets control back immediately.
+
+    Outstanding jobs are only tracked in memory. After a restart, submit() finds the glued files
+    still in S3 and picks their existing jobs back up.
+
+    Glued audio carries its sha256 in the S3 metadata. Audio that was already transcribed (e.g.
+    glued twice after a crash) reuses the cached transcript JSON instead of starting a new job,
+    and is dropped outright if its first transcription is still in the database.
+
+    Each job is run under a "transcribe:<file_id>" lease, renewed on every poll, so several
+    workers sharing the database split the glued files between them (see main.leases).
+    """
+
+    def __init__(self, backend=None, poll_initial_seconds=TRANSCRIBE_POLL_INITIAL_SECONDS,
+                 poll_max_seconds=TRANSCRIBE_POLL_MAX_SECONDS):
+        self._backend = backend
+        self.poll_initial_seconds = poll_initial_seconds
+        self.poll_max_seconds = poll_max_seconds
+        self.jobs = {}
+        self.completed = 0
+        self.failed = 0
+        self.cache_hits = 0
+        self._s3 = None
+
+    @property
+    def s3(self):
+        if self._s3 is None:
+            self._s3 = boto3.client(
+                's3',
+                aws_access_key_id=AWS_ACCESS_KEY_ID,
+                aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                region_name=REGION_NAME
+            )
+        return self._s3
+
+    @property
+    def backend(self):
+        # Created on first use, after the environment has been loaded
+        if self._backend is None:
+            self._backend = create_backend(s3=self.s3)
+            print(f"Transcribing with the {self._backend.name} backend.")
+        return self._backend
+
+    def content_hash(self, key):
+        """
+        Returns the sha256 glue() stored in the glued file's metadata, or None for older files.
+        """
+        head = self.s3.head_object(Bucket=BUCKET_NAME, Key=key)
+        return head.get('Metadata', {}).get(S3_CONTENT_HASH_METADATA)
+
+    def has_due_jobs(self, now=None):
+        now = time.monotonic() if now is None else now
+        return any(job.next_poll_at <= now for job in self.jobs.values())
+
+    def submit(self, db, now=None):
+        """
+        Starts a transcription job for every glued file that is not transcribed or tracked yet.
+
+        :return: The number of jobs submitted or picked back up.
+        """
+        now = time.monotonic() if now is None else now
+        leases = LeaseManager(db, ttl_seconds=TRANSCRIBE_LEASE_TTL_SECONDS)
+        submitted = 0
+        for key in list_glued_files(self.s3):
+            # Extract file_id from filename (e.g. "1734140358-glued.flac" -> 1734140358)
             filename = os.path.basename(key)
-            file_id_str = filename.split('-')[0]
             try:
-                file_id = int(file_id_str)
+                file_id = int(filename.split('-')[0])
             except ValueError:
                 print(f"Skipping {filename}, could not parse file_id.")
                 continue
-
-            # Create transcription job name
-            job_name = f"{file_id}-transcription-job"
+            if file_id in self.jobs:
+                continue
 
             # Check if job is already completed in DB
-            existing = Transcription.get_by_file_id(db, file_id)
-            if existing:
-                print(f"Transcription for {file_id} already processed. Retrieving existing job info...")
-                # Since it's completed in the DB, presumably you have all data already. You can skip.
+            if Transcription.get_by_file_id(db, file_id):
+                print(f"Transcription for {file_id} already processed, skipping.")
+                continue
+
+            lease = leases.acquire(f"transcribe:{file_id}")
+            if not lease:
+                # Another worker is transcribing it
+                continue
+
+            # Another worker may have finished it between the check above and the claim
+            if Transcription.get_by_file_id(db, file_id):
+                leases.release(lease)
                 continue
 
-            # Check if transcription job already exists on AWS Transcribe
             try:
-                existing_job = transcribe_client.get_transcription_job(TranscriptionJobName=job_name)
-                job_status = existing_job['TranscriptionJob']['TranscriptionJobStatus']
-                print(f"Found existing transcription job '{job_name}' with status: {job_status}")
-            except transcribe_client.exceptions.BadRequestException:
-                # Job doesn't exist, we will start a new job
-                existing_job = None
-                job_status = None
-
-            output_key = f"{S3_TRANSCRIPTION_PATH}{file_id}-transcription.json"
-            transcription_uri = f"s3://{BUCKET_NAME}/{output_key}"
-
-            if not existing_job:
-                # Start a new transcription job if not started
-                audio_file_uri = f"s3://{BUCKET_NAME}/{key}"
-
-                print(f"Starting a new transcription job for {filename}...")
-                transcribe_client.start_transcription_job(
-                    TranscriptionJobName=job_name,
-                    Media={'MediaFileUri': audio_file_uri},
-                    MediaFormat='mp3',
-                    LanguageCode='en-US',
-                    OutputBucketName=BUCKET_NAME,
-                    OutputKey=output_key
-                )
-                job_status = 'IN_PROGRESS'
-
-            # Poll until job is done if it's not completed yet
-            while job_status not in ['COMPLETED', 'FAILED']:
-                print("Job still in progress. Waiting 10 seconds...")
-                time.sleep(10)
-                status = transcribe_client.get_transcription_job(TranscriptionJobName=job_name)
-                job_status = status['TranscriptionJob']['TranscriptionJobStatus']
-
-            if job_status == 'FAILED':
-                print(f"Transcription job {job_name} failed.")
+                submitted += self._start_job(db, leases, lease, key, file_id, now)
+            except Exception as e:
+                # e.g. the audio was archived meanwhile or the backend is throttling, retry next time
+                print(f"Failed to start transcription of {filename}: {e}")
+                leases.release(lease)
+        return submitted
+
+    def _start_job(self, db, leases, lease, key, file_id, now):
+        """
+        Starts the job for one claimed glued file, or reuses the cached transcript of the same audio.
+        Releases the lease if the file needs no job.
+
+        :return: 1 if a job was submitted or picked back up, 0 otherwise.
+        """
+        filename = os.path.basename(key)
+        job = TranscriptionJob(key, file_id, now, self.poll_initial_seconds, self.content_hash(key))
+        job.lease = lease
+        if job.content_hash:
+            if any(other.content_hash == job.content_hash for other in self.jobs.values()):
+                # The same audio is already being transcribed, its transcript is reused once done
+                leases.release(lease)
+                return 0
+            cached = db.get_cached_transcript(job.content_hash)
+            if cached:
+                self.cache_hits += 1
+                db.record_transcript_cache_hit(job.content_hash)
+                print(f"{filename} has the same audio as {cached['file_id']}, reusing its transcript.")
+                if Transcription.get_by_file_id(db, cached["file_id"]):
+                    # Already transcribed and stored, drop the duplicate audio
+                    self.s3.delete_object(Bucket=BUCKET_NAME, Key=key)
+                    leases.release(lease)
+                    return 0
+                job.cached_output_key = cached["output_key"]
+                job.next_poll_at = now
+                self.jobs[file_id] = job
+                return 0
+
+        if self.backend.submit(job):
+            # An existing job was picked up, poll it in the next sweep
+            job.next_poll_at = now
+
+        self.jobs[file_id] = job
+        return 1
+
+    def poll(self, db, now=None):
+        """
+        Checks every outstanding job that is due, finalizes the completed ones, drops the failed
+        ones and backs off the rest.
+
+        :return: The file_ids finalized in this sweep.
+        """
+        now = time.monotonic() if now is None else now
+        leases = LeaseManager(db, ttl_seconds=TRANSCRIBE_LEASE_TTL_SECONDS)
+        finalized = []
+        for job in [job for job in self.jobs.values() if job.next_poll_at <= now]:
+            try:
+                leases.renew(job.lease)
+            except LeaseLost as e:
+                print(f"Dropping transcription job {job.name}: {e}")
+                del self.jobs[job.file_id]
                 continue
 
-            # Once completed, download and process the transcription JSON as before
-            output_key = f"{S3_TRANSCRIPTION_PATH}{file_id}-transcription.json"
+            try:
+                job_status = COMPLETED if job.cached_output_key else self.backend.status(job)
+            except Exception as e:
+                print(f"Failed to poll transcription job {job.name}: {e}")
+                self._back_off(job, now)
+                continue
+
+            if job_status == COMPLETED:
+                try:
+                    self.finalize(db, job)
+                except Exception as e:
+                    print(f"Failed to finalize transcription job {job.name}: {e}")
+                    self._back_off(job, now)
+                    continue
+                del self.jobs[job.file_id]
+                leases.release(job.lease)
+                self.completed += 1
+                finalized.append(job.file_id)
+            elif job_status == FAILED:
+                print(f"Transcription job {job.name} failed.")
+                del self.jobs[job.file_id]
+                leases.release(job.lease)
+                self.failed += 1
+            else:
+                self._back_off(job, now)
+        return finalized
+
+    def finalize(self, db, job):
+        """
+        Downloads and processes the transcription JSON of a completed job, archives the glued
+        audio to S3_GLUED_ARCHIVED_AUDIO_PATH and stores the transcription record in the database.
+        """
+        s3 = self.s3
+
+        # Step 1: Fetch the transcription JSON from the backend, or the cache on a content hash hit
+        if job.cached_output_key:
+            output_key = job.cached_output_key
             obj = s3.get_object(Bucket=BUCKET_NAME, Key=output_key)
             transcription_data = json.loads(obj['Body'].read())
-            transcripts = transcription_data.get("results", {}).get("transcripts", [])
-            transcription_text = transcripts[0]["transcript"] if transcripts else ""
-
-            # Move the original audio file to the archive location
-            archive_key = f"{S3_GLUED_ARCHIVED_AUDIO_PATH}{filename}"
-            s3.copy_object(
-                Bucket=BUCKET_NAME,
-                CopySource={'Bucket': BUCKET_NAME, 'Key': key},
-                Key=archive_key
-            )
-            s3.delete_object(Bucket=BUCKET_NAME, Key=key)
-
-            # Update the audio_url to point to the archived location
-            archived_audio_url = f"s3://{BUCKET_NAME}/{archive_key}"
-
-            # Save record in DB with updated audio_url (archived location)
-            t = Transcription(
-                file_id=file_id,
-                data=transcription_data,
-                transcription=transcription_text,
-                summarized=False,
-                audio_url=archived_audio_url,
-                transcribe_url=transcription_uri,
-                summary_id = None
-            )
-            t.save(db)
-            print(f"Saved transcription record for {file_id}, archived audio at {archived_audio_url}.")
         else:
-            # Not a glued file, skip or handle differently if needed.
-            pass
+            output_key = job.output_key
+            transcription_data = self.backend.result(job)
+
+        # Step 2: Map word timestamps back to the untrimmed audio if silence was removed
+        offset_map = load_offset_map(s3, job.file_id)
+        if offset_map:
+            remap_transcript_times(transcription_data, offset_map)
+        transcripts = transcription_data.get("results", {}).get("transcripts", [])
+        transcription_text = transcripts[0]["transcript"] if transcripts else ""
+
+        # Step 3: Move the original audio file to the archive location
+        archive_key = f"{S3_GLUED_ARCHIVED_AUDIO_PATH}{job.filename}"
+        s3.copy_object(
+            Bucket=BUCKET_NAME,
+            CopySource={'Bucket': BUCKET_NAME, 'Key': job.key},
+            Key=archive_key
+        )
+        s3.delete_object(Bucket=BUCKET_NAME, Key=job.key)
+        archived_audio_url = f"s3://{BUCKET_NAME}/{archive_key}"
+
+        # Step 4: Save record in DB with the archived audio url
+        t = Transcription(
+            file_id=job.file_id,
+            data=transcription_data,
+            transcription=transcription_text,
+            summarized=False,
+            audio_url=archived_audio_url,
+            transcribe_url=f"s3://{BUCKET_NAME}/{output_key}",
+            summary_id = None
+        )
+        t.save(db)
+        if job.content_hash:
+            db.save_cached_transcript(job.content_hash, job.file_id, output_key)
+        db.record_batch_transcribed(job.file_id)
+        print(f"Saved transcription record for {job.file_id}, archived audio at {archived_audio_url}.")
+
+    def stats(self):
+        return {
+            "outstanding": len(self.jobs),
+            "completed": self.completed,
+            "failed": self.failed,
+            "cache_hits": self.cache_hits,
+        }
+
+    def _back_off(self, job, now):
+        job.poll_seconds = min(job.poll_seconds * 2, self.poll_max_seconds)
+        job.next_poll_at = now + job.poll_seconds
+
+
+job_manager = TranscriptionJobManager()
+
+
+def transcribe(db):
+    """
+    Starts a transcription job for every glued file in S3 and polls the outstanding jobs once,
+    without waiting for any of them. Completed jobs are finalized by this or a later call
+    (see poll_transcriptions).
+    """
+    submitted = job_manager.submit(db)
+    if submitted:
+        print(f"Submitted {submitted} transcription jobs.")
+    job_manager.poll(db)
+
+
+def poll_transcriptions(db):
+    """
+    Finalizes the outstanding transcription jobs that are due for a poll. Cheap enough to call
+    on every scheduler tick.
+    """
+    if job_manager.has_due_jobs():
+        job_manager.poll(db)
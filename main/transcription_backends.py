@@ -0,0 +1,247 @@
+import json
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+
+import boto3
+
+from config import AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, REGION_NAME, BUCKET_NAME
+from context import TRANSCRIPTION_BACKEND, LOCAL_WHISPER_MODEL, LOCAL_TRANSCRIBE_WORKERS
+from main.encode_profiles import MEDIA_FORMATS
+
+try:
+    from faster_whisper import WhisperModel
+except ImportError:  # optional, only needed by the local backend
+    WhisperModel = None
+
+IN_PROGRESS = 'IN_PROGRESS'
+COMPLETED = 'COMPLETED'
+FAILED = 'FAILED'
+
+
+class TranscriptionBackend(ABC):
+    """
+    A speech-to-text engine behind transcribe(). Jobs are TranscriptionJob objects and results
+    use the AWS Transcribe JSON shape: results.transcripts[0].transcript and results.items with
+    start_time/end_time/alternatives per word.
+    """
+
+    name = None
+
+    @abstractmethod
+    def submit(self, job):
+        """
+        Starts transcribing job.key, or picks up a job started before a restart.
+
+        :return: True if an existing job was picked up and should be polled right away.
+        """
+
+    @abstractmethod
+    def status(self, job):
+        """
+        :return: IN_PROGRESS, COMPLETED or FAILED.
+        """
+
+    @abstractmethod
+    def result(self, job):
+        """
+        :return: The transcription JSON of a completed job.
+        """
+
+    def close(self):
+        pass
+
+
+class AwsTranscribeBackend(TranscriptionBackend):
+    """
+    Runs jobs on AWS Transcribe, which writes the JSON to job.output_key.
+    """
+
+    name = 'aws'
+
+    def __init__(self, s3=None):
+        self.s3 = s3 or boto3.client(
+            's3',
+            aws_access_key_id=AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+            region_name=REGION_NAME
+        )
+        self.transcribe_client = boto3.client(
+            'transcribe',
+            aws_access_key_id=AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+            region_name=REGION_NAME
+        )
+
+    def submit(self, job):
+        # Check if transcription job already exists on AWS Transcribe
+        try:
+            existing_job = self.transcribe_client.get_transcription_job(TranscriptionJobName=job.name)
+            job_status = existing_job['TranscriptionJob']['TranscriptionJobStatus']
+            print(f"Found existing transcription job '{job.name}' with status: {job_status}")
+            return True
+        except self.transcribe_client.exceptions.BadRequestException:
+            pass
+
+        print(f"Starting a new transcription job for {job.filename}...")
+        self.transcribe_client.start_transcription_job(
+            TranscriptionJobName=job.name,
+            Media={'MediaFileUri': f"s3://{BUCKET_NAME}/{job.key}"},
+            MediaFormat=MEDIA_FORMATS[os.path.splitext(job.key)[1]],
+            LanguageCode='en-US',
+            OutputBucketName=BUCKET_NAME,
+            OutputKey=job.output_key
+        )
+        return False
+
+    def status(self, job):
+        status = self.transcribe_client.get_transcription_job(TranscriptionJobName=job.name)
+        job_status = status['TranscriptionJob']['TranscriptionJobStatus']
+        if job_status in (COMPLETED, FAILED):
+            return job_status
+        return IN_PROGRESS
+
+    def result(self, job):
+        obj = self.s3.get_object(Bucket=BUCKET_NAME, Key=job.output_key)
+        return json.loads(obj['Body'].read())
+
+
+# Loaded once per worker process
+_whisper_model = None
+
+
+def _transcribe_file(path, model_name):
+    """
+    Transcribes an audio file with faster-whisper in a worker process, returning the
+    transcription in the AWS Transcribe JSON shape.
+    """
+    global _whisper_model
+    if _whisper_model is None:
+        _whisper_model = WhisperModel(model_name, device="cpu", compute_type="int8", cpu_threads=1)
+
+    try:
+        segments, _ = _whisper_model.transcribe(path, language="en", word_timestamps=True, vad_filter=True)
+        items = []
+        texts = []
+        for segment in segments:
+            texts.append(segment.text.strip())
+            for word in segment.words or []:
+                items.append({
+                    "type": "pronunciation",
+                    "start_time": f"{word.start:.3f}",
+                    "end_time": f"{word.end:.3f}",
+                    "alternatives": [{"confidence": f"{word.probability:.4f}", "content": word.word.strip()}],
+                })
+    finally:
+        os.remove(path)
+
+    return {
+        "jobName": os.path.basename(path),
+        "status": COMPLETED,
+        "results": {"transcripts": [{"transcript": " ".join(texts)}], "items": items},
+    }
+
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """
+    Transcribes glued files on the local CPU with faster-whisper, in a pool of processes sized
+    to the available cores. Each worker runs single-threaded so the pool does not oversubscribe
+    the cores. The JSON is also written to job.output_key so transcribe_url stays valid.
+    """
+
+    name = 'local'
+
+    def __init__(self, s3=None, model_name=LOCAL_WHISPER_MODEL, max_workers=LOCAL_TRANSCRIBE_WORKERS):
+        if WhisperModel is None:
+            raise RuntimeError("The local transcription backend needs faster-whisper, pip install faster-whisper.")
+        self.s3 = s3 or boto3.client(
+            's3',
+            aws_access_key_id=AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+            region_name=REGION_NAME
+        )
+        self.model_name = model_name
+        self.executor = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count())
+        self.futures = {}
+
+    def submit(self, job):
+        # Download the glued file, the worker deletes it once transcribed
+        extension = os.path.splitext(job.key)[1]
+        with tempfile.NamedTemporaryFile(suffix=extension, delete=False) as audio_file:
+            self.s3.download_fileobj(BUCKET_NAME, job.key, audio_file)
+        print(f"Transcribing {job.filename} locally with {self.model_name}...")
+        self.futures[job.name] = self.executor.submit(_transcribe_file, audio_file.name, self.model_name)
+        return False
+
+    def status(self, job):
+        future = self.futures.get(job.name)
+        if future is None:
+            return FAILED
+        if not future.done():
+            return IN_PROGRESS
+        if future.exception() is not None:
+            print(f"Local transcription of {job.filename} failed: {future.exception()}")
+            del self.futures[job.name]
+            return FAILED
+        return COMPLETED
+
+    def result(self, job):
+        transcription_data = self.futures[job.name].result()
+        self.s3.put_object(
+            Bucket=BUCKET_NAME,
+            Key=job.output_key,
+            Body=json.dumps(transcription_data),
+            ContentType="application/json"
+        )
+        del self.futures[job.name]
+        return transcription_data
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+class FakeBackend(TranscriptionBackend):
+    """
+    Completes every job immediately with a fixed transcript, for tests and dry runs.
+    """
+
+    name = 'fake'
+
+    def __init__(self, s3=None, transcript="unit one responding"):
+        self.transcript = transcript
+        self.submitted = []
+
+    def submit(self, job):
+        self.submitted.append(job.name)
+        return False
+
+    def status(self, job):
+        return COMPLETED if job.name in self.submitted else FAILED
+
+    def result(self, job):
+        items = [
+            {
+                "type": "pronunciation",
+                "start_time": f"{i * 0.5:.3f}",
+                "end_time": f"{i * 0.5 + 0.4:.3f}",
+                "alternatives": [{"confidence": "1.0", "content": word}],
+            }
+            for i, word in enumerate(self.transcript.split())
+        ]
+        return {"jobName": job.name, "status": COMPLETED,
+                "results": {"transcripts": [{"transcript": self.transcript}], "items": items}}
+
+
+BACKENDS = {backend.name: backend for backend in (AwsTranscribeBackend, LocalWhisperBackend, FakeBackend)}
+
+
+def create_backend(name=None, **kwargs):
+    """
+    Creates the backend named by name, the TRANSCRIPTION_BACKEND environment variable or
+    context.TRANSCRIPTION_BACKEND, in that order.
+    """
+    name = name or os.getenv("TRANSCRIPTION_BACKEND") or TRANSCRIPTION_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown transcription backend '{name}', expected one of {', '.join(BACKENDS)}.")
+    return BACKENDS[name](**kwargs)
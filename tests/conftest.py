@@ -0,0 +1,17 @@
+import sys
+import types
+
+# config.py holds the deployment's secrets and is not checked in, stand in for it with dummy values
+try:
+    import config  # noqa: F401
+except ImportError:
+    config = types.ModuleType("config")
+    config.AWS_ACCESS_KEY_ID = "test"
+    config.AWS_SECRET_ACCESS_KEY = "test"
+    config.REGION_NAME = "us-east-1"
+    config.BUCKET_NAME = "radio-summary-test"
+    config.OPENAI_API_KEY = "test"
+    config.MAILCHIMP_API_KEY = "test"
+    config.MAILCHIMP_SERVER = "test"
+    config.MAILCHIMP_RECIPIENT_LIST_ID = "test"
+    sys.modules["config"] = config
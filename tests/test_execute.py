@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from main import execute as pipeline
+from main.db.database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(tmp_path / "radio_summary.db")
+    db.create_tables()
+    yield db
+    db.close()
+
+
+def record_pending(db, count, feed_id="1311"):
+    start = int(time.time()) - count
+    chunks = [
+        {"filename": f"{start + i}-{i}.mp3", "s3_key": f"audio-files/{feed_id}/{start + i}-{i}.mp3",
+         "size_bytes": 16_000, "duration_seconds": 8.0}
+        for i in range(count)
+    ]
+    db.record_uploaded_chunks(chunks, feed_id)
+
+
+def test_execute_glues_a_backlog_in_bounded_batches(db, monkeypatch):
+    batches = []
+
+    def glue(db, flush_reason=None, cache=None, lease=None, flush_policy=None):
+        # Takes the manifest slice the real glue would and marks it glued under the lease
+        s3_keys = db.get_pending_chunks(flush_policy.max_chunks, flush_policy.max_audio_seconds, flush_policy.max_bytes)
+        db.mark_chunks_glued(s3_keys, 1734125400 + len(batches), flush_reason, lease=lease)
+        batches.append((flush_reason, len(s3_keys)))
+        return True
+
+    monkeypatch.setattr(pipeline, "scrape", lambda db, leases: [])
+    monkeypatch.setattr(pipeline, "seed_manifest", lambda db: None)
+    monkeypatch.setattr(pipeline, "glue", glue)
+    monkeypatch.setattr(pipeline, "transcribe", lambda db: None)
+
+    record_pending(db, 103)
+    pipeline.execute(db)
+
+    max_chunks = pipeline.flush_policy.max_chunks
+    assert batches == [("chunks", max_chunks)] * (103 // max_chunks)
+    # The remainder is under every limit and waits for more calls
+    assert db.get_pending_stats()["chunks"] == 103 % max_chunks
+    # The glue lease was released once the backlog was drained
+    assert db.conn.execute("SELECT expires_at FROM lease WHERE name = 'glue';").fetchone()[0] == 0
+
+
+def test_execute_stops_gluing_when_a_batch_fails(db, monkeypatch):
+    calls = []
+
+    def glue(db, **kwargs):
+        calls.append(kwargs["flush_reason"])
+        return False
+
+    monkeypatch.setattr(pipeline, "scrape", lambda db, leases: [])
+    monkeypatch.setattr(pipeline, "seed_manifest", lambda db: None)
+    monkeypatch.setattr(pipeline, "glue", glue)
+    monkeypatch.setattr(pipeline, "transcribe", lambda db: None)
+
+    record_pending(db, 100)
+    pipeline.execute(db)
+
+    assert calls == ["chunks"]
+    assert db.get_pending_stats()["chunks"] == 100
+
+
+def test_daily_tasks_run_once_per_day_across_workers(db, monkeypatch):
+    archived = []
+    monkeypatch.setattr(pipeline, "archive_transcriptions", lambda db: archived.append(db))
+
+    # Each worker's schedule fires in turn, long after the first one finished
+    for worker in ("worker-a", "worker-b", "worker-c"):
+        monkeypatch.setenv("WORKER_ID", worker)
+        pipeline.archive_nightly(db)
+    assert len(archived) == 1
+
+    day = time.strftime("%Y-%m-%d")
+    owner, expires_at = db.conn.execute(
+        "SELECT owner, expires_at FROM lease WHERE name = ?;", (f"archive:{day}",)
+    ).fetchone()
+    assert owner == "worker-a"
+    assert expires_at > time.time()
+
+    # The next day's run is claimed under its own name
+    assert pipeline.claim_daily(db, "archive", "2099-01-01")
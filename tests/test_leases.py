@@ -0,0 +1,112 @@
+import multiprocessing
+import time
+
+import pytest
+
+from main.db.database import Database
+from main.leases import LeaseLost, LeaseManager
+
+WORK = ["scrape:1311", "scrape:1312", "scrape:1313", "glue"] + [f"transcribe:{file_id}" for file_id in range(1, 21)]
+WORKERS = 6
+
+
+def claim_work(db_path, owner, start, barrier, results):
+    db = Database(db_path)
+    leases = LeaseManager(db, owner=owner, ttl_seconds=60)
+    barrier.wait()
+    # Every worker walks the work from a different place, so they race for the same names
+    claimed = []
+    for name in WORK[start:] + WORK[:start]:
+        if leases.acquire(name):
+            claimed.append(name)
+    results.put((owner, claimed))
+    db.close()
+
+
+def acquire(db_path, owner, names, ttl_seconds, results):
+    db = Database(db_path)
+    leases = LeaseManager(db, owner=owner, ttl_seconds=ttl_seconds)
+    results.put([leases.acquire(name) for name in names])
+    db.close()
+
+
+def run(target, *args):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=target, args=args + (results,))
+    process.start()
+    result = results.get(timeout=30)
+    process.join(timeout=30)
+    assert process.exitcode == 0
+    return result
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "radio_summary.db"
+    Database(path).close()
+    return path
+
+
+def test_each_lease_is_claimed_by_exactly_one_process(db_path):
+    barrier = multiprocessing.Barrier(WORKERS)
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=claim_work, args=(db_path, f"worker-{i}", i * 4 % len(WORK), barrier, results))
+        for i in range(WORKERS)
+    ]
+    for process in processes:
+        process.start()
+    claims = [results.get(timeout=60) for _ in processes]
+    for process in processes:
+        process.join(timeout=30)
+        assert process.exitcode == 0
+
+    claimed = sorted(name for _, names in claims for name in names)
+    assert claimed == sorted(WORK)
+
+    db = Database(db_path)
+    owners = dict(db.conn.execute("SELECT name, owner FROM lease;").fetchall())
+    for owner, names in claims:
+        assert all(owners[name] == owner for name in names)
+    db.close()
+
+
+def test_takeover_after_expiry_bumps_the_token_and_fences_the_old_holder(db_path):
+    old_scrape, old_glue = run(acquire, db_path, "worker-a", ["scrape:1311", "glue"], 0.5)
+    assert run(acquire, db_path, "worker-b", ["scrape:1311", "glue"], 60) == [None, None]
+
+    time.sleep(1)
+    new_scrape, new_glue = run(acquire, db_path, "worker-b", ["scrape:1311", "glue"], 60)
+    assert new_scrape.token == old_scrape.token + 1
+    assert new_glue.token == old_glue.token + 1
+
+    db = Database(db_path)
+    chunk = {"filename": "1734125390-111.mp3", "s3_key": "audio-files/1311/1734125390-111.mp3"}
+
+    with pytest.raises(LeaseLost):
+        db.record_uploaded_chunks([chunk], "1311", lease=old_scrape)
+    assert db.get_pending_chunks() == []
+    assert db.get_last_uploaded_filename("1311") == "0-0.mp3"
+
+    db.record_uploaded_chunks([chunk], "1311", lease=new_scrape)
+    assert db.get_pending_chunks() == [chunk["s3_key"]]
+
+    with pytest.raises(LeaseLost):
+        db.mark_chunks_glued([chunk["s3_key"]], 1734125400, lease=old_glue)
+    assert db.get_pending_chunks() == [chunk["s3_key"]]
+
+    db.mark_chunks_glued([chunk["s3_key"]], 1734125400, lease=new_glue)
+    assert db.get_pending_chunks() == []
+    db.close()
+
+
+def test_released_lease_is_taken_over_with_a_higher_token(db_path):
+    db = Database(db_path)
+    leases = LeaseManager(db, owner="worker-a")
+    lease = leases.acquire("glue")
+    leases.release(lease)
+    db.close()
+
+    (taken,) = run(acquire, db_path, "worker-b", ["glue"], 60)
+    assert taken.owner == "worker-b"
+    assert taken.token == lease.token + 1
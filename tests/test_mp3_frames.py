@@ -0,0 +1,36 @@
+import io
+
+import pytest
+
+from main.helpers.mp3_frames import Mp3Concatenator, Mp3FormatError, iter_frames
+
+STEREO, JOINT_STEREO, MONO = 0b00, 0b01, 0b11
+
+
+def mp3(frames, channel_mode):
+    # MPEG-1 layer III, 128 kbps, 44.1 kHz, no padding: 417 byte frames
+    header = bytes([0xFF, 0xFB, 0x90, channel_mode << 6])
+    return (header + bytes(417 - len(header))) * frames
+
+
+def test_frames_are_parsed_with_their_channel_mode():
+    headers = [header for _, header in iter_frames(mp3(3, MONO))]
+    assert len(headers) == 3
+    assert all(header.is_mono and header.frame_length == 417 for header in headers)
+    assert not any(header.is_mono for _, header in iter_frames(mp3(3, JOINT_STEREO)))
+
+
+def test_stereo_modes_are_glued_at_the_frame_level():
+    output = io.BytesIO()
+    concatenator = Mp3Concatenator(output)
+    concatenator.add(mp3(2, STEREO), "stereo.mp3")
+    concatenator.add(mp3(3, JOINT_STEREO), "joint_stereo.mp3")
+    assert concatenator.frames == 5
+    assert output.getvalue() == mp3(2, STEREO) + mp3(3, JOINT_STEREO)
+
+
+def test_mono_and_stereo_are_not_mixed():
+    concatenator = Mp3Concatenator(io.BytesIO())
+    concatenator.add(mp3(2, STEREO), "stereo.mp3")
+    with pytest.raises(Mp3FormatError, match="mono.mp3 is 44100 Hz layer 3 mono, expected 44100 Hz layer 3 stereo"):
+        concatenator.add(mp3(2, MONO), "mono.mp3")
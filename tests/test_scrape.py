@@ -0,0 +1,145 @@
+import pickle
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from main import feed_scheduler, feeds
+from main.db.database import Database
+from main.feed_scheduler import EMPTY_CALLS_TABLE, scrape_feed, scrape_feeds
+from main.feeds import Feed
+from main.login_and_scrape import fetch_mp3_urls, load_cookie_session
+
+CALLS_PAGE = """
+<html><body>
+<table id="callsTable" class="table">
+  <thead><tr><th>Time</th><th>Audio</th></tr></thead>
+  <tbody>
+    <tr><td>12:29</td><td><a href="/calls/audio/1734125390-111.mp3">play</a></td></tr>
+    <tr><td>12:30</td><td><a href="https://calls.example.com/1734125450-112.mp3">play</a></td></tr>
+    <tr><td><table><tr><td><a href="1734125510-113.mp3">nested</a></td></tr></table></td></tr>
+  </tbody>
+</table>
+<a href="/outside-the-table.mp3">not a call</a>
+</body></html>
+"""
+
+EMPTY_CALLS_PAGE = """
+<html><body>
+<table id="callsTable" class="table"><thead><tr><th>Time</th><th>Audio</th></tr></thead><tbody></tbody></table>
+</body></html>
+"""
+
+LOGIN_PAGE = """
+<html><body>
+<form action="/login/"><input id="signinSrEmail"><input id="signinSrPassword" type="password"></form>
+</body></html>
+"""
+
+# Stand-in calls pages by talkgroup, as (status, body). Every page but the login page needs the session cookie.
+PAGES = {
+    "1311": (200, CALLS_PAGE),
+    "1312": (403, "Forbidden"),
+    "1313": (200, LOGIN_PAGE),
+    "1314": (200, EMPTY_CALLS_PAGE),
+}
+
+
+class CallsPageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        status, body = PAGES.get(self.path.rstrip("/").rsplit("/", 1)[-1], (404, "Not Found"))
+        if "session=saved" not in (self.headers.get("Cookie") or ""):
+            status, body = 401, "Unauthorized"
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = HTTPServer(("127.0.0.1", 0), CallsPageHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def cookies_file(tmp_path):
+    path = tmp_path / "cookies.pkl"
+    with open(path, "wb") as f:
+        pickle.dump([{"name": "session", "value": "saved", "domain": "127.0.0.1", "path": "/"}], f)
+    return str(path)
+
+
+@pytest.fixture
+def calls_url(server, monkeypatch):
+    monkeypatch.setattr(feeds, "BROADCASTIFY_CALLS_URL", f"{server}/calls/tg/")
+    return f"{server}/calls/tg/6957/"
+
+
+def fetch(cookies_file, url):
+    session = load_cookie_session(cookies_file)
+    try:
+        return fetch_mp3_urls(session, url)
+    finally:
+        session.close()
+
+
+def test_calls_page_links_are_resolved_against_the_page(server, cookies_file, calls_url):
+    assert fetch(cookies_file, calls_url + "1311") == [
+        f"{server}/calls/audio/1734125390-111.mp3",
+        "https://calls.example.com/1734125450-112.mp3",
+        f"{server}/calls/tg/6957/1734125510-113.mp3",
+    ]
+
+
+def test_rejected_session_is_reported(server, cookies_file, calls_url, tmp_path):
+    assert fetch(cookies_file, calls_url + "1312") is None
+    # Without the saved cookies the server answers 401
+    assert fetch(str(tmp_path / "missing.pkl"), calls_url + "1311") is None
+
+
+def test_login_page_is_reported_as_a_rejected_session(cookies_file, calls_url):
+    assert fetch(cookies_file, calls_url + "1313") is None
+
+
+def test_empty_calls_table_is_no_calls_on_a_new_feed(cookies_file, calls_url):
+    assert fetch(cookies_file, calls_url + "1314") == []
+    uploaded, stats = scrape_feed(Feed("6957", "1314"), "0-0.mp3", cookies_file, None, None, None)
+    assert uploaded == []
+    assert stats["listed"] == 0
+
+
+def test_empty_calls_table_on_a_feed_with_calls_falls_back_to_the_browser(cookies_file, calls_url):
+    result = scrape_feed(Feed("6957", "1314"), "1734125390-111.mp3", cookies_file, None, None, None)
+    assert result == EMPTY_CALLS_TABLE
+
+
+def test_scrape_feeds_scrapes_empty_tables_with_the_browser(tmp_path, cookies_file, calls_url, monkeypatch):
+    db = Database(tmp_path / "radio_summary.db")
+    db.create_tables()
+    # Both feeds had calls before, and 1311 has nothing newer
+    db.record_uploaded_chunks([{"filename": "1734125510-113.mp3"}], "1311")
+    db.record_uploaded_chunks([{"filename": "1734125390-111.mp3"}], "1314")
+
+    browser_feeds = []
+
+    def scrape_with_browser(db, feeds, *args, **kwargs):
+        browser_feeds.extend(feed.feed_id for feed in feeds)
+        return {feed.feed_id: {"listed": 1, "new": 1, "overlap": True, "gap_seconds": 0} for feed in feeds}
+
+    monkeypatch.setattr(feed_scheduler, "scrape_with_browser", scrape_with_browser)
+    feed_stats = scrape_feeds(db, [Feed("6957", "1311"), Feed("6957", "1314")], "email", "password", cookies_file)
+    db.close()
+
+    assert browser_feeds == ["1314"]
+    assert feed_stats["1311"]["new"] == 0
+    assert feed_stats["1314"]["new"] == 1
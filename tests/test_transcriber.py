@@ -0,0 +1,87 @@
+import pytest
+
+from context import S3_CONTENT_HASH_METADATA, S3_GLUED_ARCHIVED_AUDIO_PATH, S3_GLUED_AUDIO_PATH
+from main import transcriber
+from main.db.database import Database
+from main.models.transcription import Transcription
+from main.transcriber import TranscriptionJobManager
+from main.transcription_backends import FakeBackend
+
+FILE_ID = 1734140358
+KEY = f"{S3_GLUED_AUDIO_PATH}{FILE_ID}-glued.flac"
+
+
+class NoSuchKey(Exception):
+    pass
+
+
+class StubS3:
+    """
+    The S3 calls the job manager makes, against an in-memory bucket.
+    """
+
+    class exceptions:
+        NoSuchKey = NoSuchKey
+
+    def __init__(self, objects):
+        self.objects = dict(objects)
+
+    def head_object(self, Bucket, Key):
+        return {"Metadata": {S3_CONTENT_HASH_METADATA: f"sha256-of-{Key}"}}
+
+    def get_object(self, Bucket, Key):
+        raise NoSuchKey(Key)
+
+    def copy_object(self, Bucket, CopySource, Key):
+        self.objects[Key] = self.objects[CopySource["Key"]]
+
+    def delete_object(self, Bucket, Key):
+        del self.objects[Key]
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(tmp_path / "radio_summary.db")
+    db.create_tables()
+    yield db
+    db.close()
+
+
+def test_completed_fake_job_is_finalized_and_its_lease_released(db, monkeypatch):
+    s3 = StubS3({KEY: b"glued audio"})
+    monkeypatch.setattr(transcriber, "list_glued_files", lambda s3: list(s3.objects))
+    manager = TranscriptionJobManager(backend=FakeBackend(transcript="unit one responding"))
+    manager._s3 = s3
+
+    assert manager.submit(db, now=0) == 1
+    lease_expires_at = db.conn.execute(
+        "SELECT expires_at FROM lease WHERE name = ?;", (f"transcribe:{FILE_ID}",)
+    ).fetchone()[0]
+    assert lease_expires_at > 0
+
+    # Not due before its first poll, then completed in one sweep
+    assert manager.poll(db, now=0) == []
+    assert manager.poll(db, now=manager.poll_initial_seconds) == [FILE_ID]
+    assert manager.jobs == {}
+    assert manager.stats()["completed"] == 1
+
+    transcription = Transcription.get_by_file_id(db, FILE_ID)
+    assert transcription.transcription == "unit one responding"
+    results = transcription.data["results"]
+    assert results["transcripts"] == [{"transcript": "unit one responding"}]
+    assert [item["alternatives"][0]["content"] for item in results["items"]] == ["unit", "one", "responding"]
+    assert all(float(item["start_time"]) < float(item["end_time"]) for item in results["items"])
+
+    # The glued audio was moved to the archive
+    archive_key = f"{S3_GLUED_ARCHIVED_AUDIO_PATH}{FILE_ID}-glued.flac"
+    assert list(s3.objects) == [archive_key]
+    assert transcription.audio_url.endswith(archive_key)
+    assert db.get_cached_transcript(f"sha256-of-{KEY}")["file_id"] == FILE_ID
+
+    assert db.conn.execute(
+        "SELECT expires_at FROM lease WHERE name = ?;", (f"transcribe:{FILE_ID}",)
+    ).fetchone()[0] == 0
+
+    # The transcribed file is not submitted again
+    s3.objects[KEY] = b"glued audio"
+    assert manager.submit(db, now=0) == 0